@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None  # на Windows пиковая память не измеряется
+
+from personal_assistant import (NoteManager, TaskManager, ContactManager, FinanceManager, NOTES_FILE, TASKS_FILE,
+                                CONTACTS_FILE, FINANCE_FILE, STORAGE_BACKEND, TASK_PRIORITIES, save_data, flush,
+                                migrate_to_sqlite)
+
+SIZES = [1000, 100000, 1000000]
+OPERATIONS = 1000  # сколько раз повторяются короткие операции: поиск, добавление, фильтры
+REGRESSION_THRESHOLD = 0.2  # допустимое ухудшение относительно базовой линии
+SEED = 42
+
+WORDS = ['встреча', 'отчёт', 'покупки', 'проект', 'звонок', 'договор', 'ремонт', 'отпуск', 'подарок', 'врач',
+         'собрание', 'счёт', 'книга', 'спорт', 'машина', 'квартира', 'семья', 'работа', 'учёба', 'дача']
+FIRST_NAMES = ['Иван', 'Пётр', 'Анна', 'Мария', 'Сергей', 'Ольга', 'Алексей', 'Елена', 'Дмитрий', 'Наталья']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Волков', 'Соколов', 'Лебедев', 'Козлов']
+TRANSLIT = {'Иван': 'ivan', 'Пётр': 'petr', 'Анна': 'anna', 'Мария': 'maria', 'Сергей': 'sergey', 'Ольга': 'olga',
+            'Алексей': 'alexey', 'Елена': 'elena', 'Дмитрий': 'dmitry', 'Наталья': 'natalia'}
+CATEGORIES = ['Еда', 'Транспорт', 'Жильё', 'Здоровье', 'Развлечения', 'Одежда', 'Зарплата', 'Подарки']
+
+
+def random_date(rng):
+    return f'{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(2020, 2025)}'
+
+
+def random_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_notes(count, rng):
+    return [{
+        'note_id': note_id,
+        'title': random_text(rng, 2).capitalize(),
+        'content': random_text(rng, 12),
+        'timestamp': f'{rng.randint(2020, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00',
+    } for note_id in range(1, count + 1)]
+
+
+def generate_tasks(count, rng):
+    return [{
+        'task_id': task_id,
+        'title': random_text(rng, 3).capitalize(),
+        'description': random_text(rng, 8),
+        'done': rng.random() < 0.3,
+        'priority': rng.choice(TASK_PRIORITIES),
+        'due_date': random_date(rng) if rng.random() < 0.8 else None,
+    } for task_id in range(1, count + 1)]
+
+
+def generate_contacts(count, rng):
+    contacts = []
+    for contact_id in range(1, count + 1):
+        first_name = rng.choice(FIRST_NAMES)
+        digits = rng.randint(0, 10 ** 9 - 1)
+        contacts.append({
+            'contact_id': contact_id,
+            'name': f'{first_name} {rng.choice(LAST_NAMES)}',
+            'phone': f'+7 9{digits // 10 ** 7:02d} {digits // 10 ** 4 % 1000:03d}-{digits // 100 % 100:02d}-'
+                     f'{digits % 100:02d}',
+            'email': f'{TRANSLIT[first_name]}{contact_id}@example.com',
+        })
+    return contacts
+
+
+def generate_records(count, rng):
+    records = []
+    for record_id in range(1, count + 1):
+        category = rng.choice(CATEGORIES)
+        amount = round(rng.uniform(30000, 150000), 2) if category == 'Зарплата' else -round(rng.uniform(50, 20000), 2)
+        records.append({
+            'record_id': record_id,
+            'description': random_text(rng, 3).capitalize(),
+            'amount': amount,
+            'category': category,
+            'date': random_date(rng),
+        })
+    return records
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Bench:
+    # Собирает замеры одного прогона: для каждой операции число вызовов, общее время и задержки
+    def __init__(self, size):
+        self.size = size
+        self.results = {}
+
+    def record(self, name, latencies, items=None):
+        ordered = sorted(latencies)
+        total = sum(ordered)
+        count = items if items is not None else len(ordered)
+        self.results[name] = {
+            'ops': count,
+            'total_sec': total,
+            'per_sec': count / total if total else None,
+            'p50_ms': percentile(ordered, 0.5) * 1000,
+            'p95_ms': percentile(ordered, 0.95) * 1000,
+            'p99_ms': percentile(ordered, 0.99) * 1000,
+        }
+
+    def once(self, name, run, items=None):
+        # одиночная операция над всем хранилищем; пропускная способность считается в записях
+        started = time.perf_counter()
+        result = run()
+        self.record(name, [time.perf_counter() - started], items)
+        return result
+
+    def repeat(self, name, run, args):
+        latencies = []
+        for arg in args:
+            started = time.perf_counter()
+            run(arg)
+            latencies.append(time.perf_counter() - started)
+        self.record(name, latencies)
+
+
+def timed_adds(bench, name, manager, add, args):
+    # добавления идут в одном пакете, чтобы измерить саму операцию, а запись на диск — отдельно
+    with manager.batch():
+        bench.repeat(name, add, args)
+        started = time.perf_counter()
+    bench.record(name + ': фиксация', [time.perf_counter() - started])
+
+
+def timed_export(bench, name, export, items):
+    # выгрузка замеряется без сжатия и с gzip, пропускная способность дополнительно считается в МБ/с
+    for suffix, compress in (('', False), (' (gzip)', True)):
+        report = bench.once(name + suffix, lambda: export(compress=compress), items)
+        bench.results[name + suffix]['mb_per_sec'] = report.throughput()
+
+
+def bench_notes(bench, size, ops, rng):
+    manager = bench.once('notes: загрузка', NoteManager, size)
+    ids = [rng.randint(1, size) for _ in range(ops)]
+    bench.repeat('notes: поиск по ID', manager.get_note_by_id, ids)
+    bench.repeat('notes: полнотекстовый поиск', manager.search_notes, [rng.choice(WORDS) for _ in range(ops // 10)])
+    timed_adds(bench, 'notes: добавление', manager, lambda i: manager.add_note(f'Заметка {i}', random_text(rng, 12)),
+               range(ops))
+    bench.once('notes: сохранение', lambda: (manager.save_notes(), flush()), len(manager.notes))
+    timed_export(bench, 'notes: экспорт CSV', manager.export_notes_to_csv, len(manager.notes))
+    bench.once('notes: импорт CSV', lambda: manager.import_notes_from_csv('notes.csv'), len(manager.notes))
+
+
+def bench_tasks(bench, size, ops, rng):
+    manager = bench.once('tasks: загрузка', TaskManager, size)
+    ids = [rng.randint(1, size) for _ in range(ops)]
+    bench.repeat('tasks: поиск по ID', manager.get_task_by_id, ids)
+    bench.repeat('tasks: ближайшие', manager.next_tasks, [10] * ops)
+    timed_adds(bench, 'tasks: добавление', manager,
+               lambda i: manager.add_task(f'Задача {i}', random_text(rng, 8), 'Средний', random_date(rng)), range(ops))
+    bench.once('tasks: сохранение', lambda: (manager.save_tasks(), flush()), len(manager.tasks))
+    timed_export(bench, 'tasks: экспорт CSV', manager.export_tasks_to_csv, len(manager.tasks))
+    bench.once('tasks: импорт CSV', lambda: manager.import_tasks_from_csv('tasks.csv'), len(manager.tasks))
+
+
+def bench_contacts(bench, size, ops, rng):
+    manager = bench.once('contacts: загрузка', ContactManager, size)
+    ids = [rng.randint(1, size) for _ in range(ops)]
+    bench.repeat('contacts: поиск по ID', manager.get_contact_by_id, ids)
+    queries = [rng.choice(LAST_NAMES)[:4] if i % 2 else f'{rng.randint(0, 999):03d}' for i in range(ops // 10)]
+    bench.repeat('contacts: search_contacts', manager.search_contacts, queries)
+    timed_adds(bench, 'contacts: добавление', manager,
+               lambda i: manager.add_contact(f'Контакт {i}', f'+7 900 000-00-{i % 100:02d}', f'c{i}@example.com'),
+               range(ops))
+    bench.once('contacts: сохранение', lambda: (manager.save_contacts(), flush()), len(manager.contacts))
+    timed_export(bench, 'contacts: экспорт CSV', manager.export_contacts_to_csv, len(manager.contacts))
+    bench.once('contacts: импорт CSV', lambda: manager.import_contacts_from_csv('contacts.csv'), len(manager.contacts))
+
+
+def bench_finance(bench, size, ops, rng):
+    manager = bench.once('finance: загрузка', FinanceManager, size)
+    ids = [rng.randint(1, size) for _ in range(ops)]
+    bench.repeat('finance: поиск по ID', manager.get_record_by_id, ids)
+    filters = [(random_date(rng), None) if i % 2 else (None, rng.choice(CATEGORIES)) for i in range(ops // 100 or 1)]
+    bench.repeat('finance: view_records', lambda args: manager.view_records(*args), filters)
+    periods = [sorted((random_date(rng), random_date(rng)), key=lambda date: date[6:] + date[3:5] + date[:2])
+               for _ in range(ops)]
+    bench.repeat('finance: generate_report', lambda period: manager.generate_report(*period), periods)
+    bench.repeat('finance: group_by_category', lambda _: manager.group_by_category(), range(ops // 10))
+    timed_adds(bench, 'finance: добавление', manager,
+               lambda i: manager.add_record(f'Покупка {i}', -100.0, rng.choice(CATEGORIES), random_date(rng)),
+               range(ops))
+    bench.once('finance: сохранение', lambda: (manager.save_records(), flush()), len(manager.records))
+    timed_export(bench, 'finance: экспорт CSV', manager.export_records_to_csv, len(manager.records))
+    bench.once('finance: импорт CSV', lambda: manager.import_records_from_csv('records.csv'), len(manager.records))
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024  # в Linux значение в килобайтах
+
+
+BENCHMARKS = {
+    'notes': (NOTES_FILE, generate_notes, bench_notes),
+    'tasks': (TASKS_FILE, generate_tasks, bench_tasks),
+    'contacts': (CONTACTS_FILE, generate_contacts, bench_contacts),
+    'finance': (FINANCE_FILE, generate_records, bench_finance),
+}
+
+
+def run_store(store, size, ops):
+    file_path, generate, run = BENCHMARKS[store]
+    rng = random.Random(SEED)
+    started = time.perf_counter()
+    save_data(file_path, generate(size, rng), durable=False)
+    if STORAGE_BACKEND == 'sqlite':
+        migrate_to_sqlite()
+    generated = time.perf_counter() - started
+    bench = Bench(size)
+    run(bench, size, ops, rng)
+    return {'size': size, 'store': store, 'generate_sec': generated, 'peak_rss': peak_rss(), 'results': bench.results}
+
+
+def run_worker(store, size, ops, output):
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            result = run_store(store, size, ops)
+            flush()
+        os.chdir(os.path.dirname(output))
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(result, file, ensure_ascii=False)
+
+
+def measure(store, size, ops):
+    # каждое хранилище и размер измеряются в отдельном процессе и пустом каталоге, чтобы пиковая память не копилась
+    with tempfile.TemporaryDirectory() as out_dir:
+        output = os.path.join(out_dir, 'result.json')
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', store, '--sizes', str(size),
+                        '--ops', str(ops), '--output', output], check=True)
+        with open(output, encoding='utf-8') as file:
+            return json.load(file)
+
+
+def run_key(run):
+    return f'{run["size"]}/{run["store"]}'
+
+
+def format_number(value, digits=2):
+    return '-' if value is None else f'{value:.{digits}f}'
+
+
+def print_report(run):
+    print(f'\n{run["store"]}: {run["size"]} записей, хранилище {STORAGE_BACKEND}')
+    print(f'Генерация данных: {run["generate_sec"]:.2f} с')
+    if run['peak_rss'] is not None:
+        print(f'Пиковая память: {run["peak_rss"] / 2 ** 20:.1f} МБ')
+    print(f'{"Операция":<36}{"операций":>10}{"всего, с":>10}{"в секунду":>14}{"p50, мс":>10}{"p95, мс":>10}'
+          f'{"p99, мс":>10}')
+    for name, result in run['results'].items():
+        print(f'{name:<36}{result["ops"]:>10}{result["total_sec"]:>10.3f}{format_number(result["per_sec"], 0):>14}'
+              f'{result["p50_ms"]:>10.3f}{result["p95_ms"]:>10.3f}{result["p99_ms"]:>10.3f}')
+    for name, result in run['results'].items():
+        if 'mb_per_sec' in result:
+            print(f'{name}: {result["mb_per_sec"]:.1f} МБ/с')
+
+
+def compare(runs, baseline, threshold):
+    # регрессия — падение пропускной способности или рост p99 и пиковой памяти больше порога
+    regressions = []
+    for run in runs:
+        base_run = baseline.get(run_key(run))
+        if base_run is None:
+            continue
+        if run['peak_rss'] and base_run['peak_rss'] and run['peak_rss'] > base_run['peak_rss'] * (1 + threshold):
+            regressions.append(f'{run["size"]}: {run["store"]}: пиковая память {base_run["peak_rss"] / 2 ** 20:.1f} -> '
+                               f'{run["peak_rss"] / 2 ** 20:.1f} МБ')
+        for name, result in run['results'].items():
+            base = base_run['results'].get(name)
+            if base is None:
+                continue
+            if result['per_sec'] and base['per_sec'] and result['per_sec'] < base['per_sec'] * (1 - threshold):
+                regressions.append(f'{run["size"]}: {name}: {base["per_sec"]:.0f} -> {result["per_sec"]:.0f} в секунду')
+            elif result['ops'] > 1 and result['p99_ms'] > base['p99_ms'] * (1 + threshold):
+                regressions.append(f'{run["size"]}: {name}: p99 {base["p99_ms"]:.3f} -> {result["p99_ms"]:.3f} мс')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры скорости менеджеров на синтетических данных')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='размеры хранилищ через запятую')
+    parser.add_argument('--stores', default=','.join(BENCHMARKS), help='хранилища через запятую')
+    parser.add_argument('--ops', type=int, default=OPERATIONS, help='повторов коротких операций')
+    parser.add_argument('--save-baseline', metavar='ФАЙЛ', help='сохранить результаты как базовую линию')
+    parser.add_argument('--baseline', metavar='ФАЙЛ', help='сравнить с базовой линией')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='допустимое ухудшение, доля')
+    parser.add_argument('--worker', choices=BENCHMARKS, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.worker is not None:
+        run_worker(args.worker, sizes[0], args.ops, os.path.abspath(args.output))
+        return 0
+
+    runs = []
+    for size in sizes:
+        for store in args.stores.split(','):
+            run = measure(store, size, args.ops)
+            print_report(run)
+            runs.append(run)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump({run_key(run): run for run in runs}, file, ensure_ascii=False, indent=4)
+        print(f'\nБазовая линия сохранена в {args.save_baseline}')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(runs, json.load(file), args.threshold)
+        if regressions:
+            print(f'\nУхудшения больше {args.threshold:.0%} относительно {args.baseline}:')
+            for regression in regressions:
+                print(regression)
+            return 1
+        print(f'\nУхудшений относительно {args.baseline} нет')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
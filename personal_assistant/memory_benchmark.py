@@ -0,0 +1,47 @@
+import sys
+import tracemalloc
+
+from personal_assistant import Note, Task, Contact, FinanceRecord
+
+RECORDS = 100000
+
+SAMPLES = {
+    Note: {'note_id': 1, 'title': 'Покупки', 'content': 'Купить молоко и хлеб', 'timestamp': '2024-01-01 12:00:00'},
+    Task: {'task_id': 1, 'title': 'Отчёт', 'description': 'Подготовить отчёт', 'done': False,
+           'priority': 'Средний', 'due_date': '01-02-2024'},
+    Contact: {'contact_id': 1, 'name': 'Иван Петров', 'phone': '+7 900 123-45-67', 'email': 'ivan@example.com'},
+    FinanceRecord: {'record_id': 1, 'description': 'Обед', 'amount': -450.0, 'category': 'Еда',
+                    'date': '01-02-2024'},
+}
+
+
+def dict_based(cls):
+    # тот же класс, но без __slots__ — так записи были устроены раньше
+    return type(cls.__name__, (), {'__init__': cls.__init__})
+
+
+def bytes_per_record(cls, sample, count=RECORDS):
+    # значения полей общие для всех записей, поэтому замер показывает только накладные расходы объекта
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    records = [cls(**sample) for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del records
+    return size / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else RECORDS
+    print(f'Память на запись, байт (записей: {count}):')
+    print(f'{"Тип":<15}{"до":>10}{"после":>10}{"экономия":>10}')
+    for cls, sample in SAMPLES.items():
+        assert cls.from_dict(sample).to_dict() == sample, f'{cls.__name__}: формат JSON изменился'
+        old = bytes_per_record(dict_based(cls), sample, count)
+        new = bytes_per_record(cls, sample, count)
+        print(f'{cls.__name__:<15}{old:>10.1f}{new:>10.1f}{1 - new / old:>10.0%}')
+
+
+if __name__ == '__main__':
+    main()
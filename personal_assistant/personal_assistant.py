@@ -1,25 +1,1097 @@
 import os
+import sys
+import time
 import json
 import csv
+import argparse
+import shlex
+import atexit
+import collections
+import bisect
+import heapq
+import math
+import ast
+import operator
+import functools
+import hashlib
+import re
+import zlib
+import gzip
+import unicodedata
+import itertools
+import contextlib
+import sqlite3
+import struct
 import datetime
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+PROCESS_START = time.perf_counter()
+STARTUP_BUDGET_MS = 300
+STARTUP_TRACE = os.environ.get('PA_STARTUP_TRACE') == '1'
+
+np = None  # NumPy подгружается при первом обращении к колоночной аналитике, чтобы не замедлять запуск
+numpy_checked = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # на Windows блокировка между процессами недоступна
 
 NOTES_FILE = 'notes.json'
 TASKS_FILE = 'tasks.json'
 CONTACTS_FILE = 'contacts.json'
 FINANCE_FILE = 'finance.json'
+NOTES_INDEX_FILE = 'notes.index.json'
+COLUMNAR_ANALYTICS = os.environ.get('PA_COLUMNAR') == '1'
+DATA_FORMAT = os.environ.get('PA_FORMAT', 'pretty')  # pretty, compact или binary
+BINARY_FILES = {FINANCE_FILE, CONTACTS_FILE}  # большие хранилища, которые в режиме binary пишутся записями
+BINARY_MAGIC = b'PAB1'
+DURABLE_WRITES = os.environ.get('PA_FSYNC', '1') == '1'  # fsync после каждой фиксации
+GROUP_COMMIT_WINDOW = float(os.environ.get('PA_GROUP_COMMIT', '0'))  # окно группировки записей в секундах, 0 — сразу
+
+io_stats = {'writes': 0, 'fsyncs': 0, 'bytes': 0, 'reads': 0, 'bytes_read': 0}
+scan_stats = {}  # запрос -> [число запросов, просмотрено записей]
+
+
+def record_scan(query, count):
+    stats = scan_stats.get(query)
+    if stats is None:
+        stats = scan_stats[query] = [0, 0]
+    stats[0] += 1
+    stats[1] += count
+
+
+def load_numpy():
+    global np, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+    return np
+
+
+def dumps_compact(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    if ujson is not None:
+        return ujson.dumps(data, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    if ujson is not None:
+        return ujson.loads(raw)
+    return json.loads(raw)
+
+
+def encode_records(records):
+    # двоичный формат: сигнатура, затем каждая запись как длина (4 байта) и компактный JSON
+    parts = [BINARY_MAGIC]
+    for record in records:
+        payload = dumps_compact(record)
+        parts.append(struct.pack('<I', len(payload)))
+        parts.append(payload)
+    return b''.join(parts)
+
+
+def decode_records(raw):
+    records = []
+    offset = len(BINARY_MAGIC)
+    while offset < len(raw):
+        size, = struct.unpack_from('<I', raw, offset)
+        offset += 4
+        records.append(loads(raw[offset:offset + size]))
+        offset += size
+    return records
+
+
+def data_format(file_path):
+    if DATA_FORMAT == 'binary':
+        return 'binary' if file_path in BINARY_FILES else 'compact'
+    return DATA_FORMAT
+
+
+def encode_data(data, file_format):
+    if file_format == 'binary' and isinstance(data, list):
+        return encode_records(data)
+    if file_format == 'pretty':
+        return json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+    return dumps_compact(data)
+
+
+def decode_data(raw):
+    if raw.startswith(BINARY_MAGIC):
+        return decode_records(raw)
+    return loads(raw)
+
+
+def fsync_file(file):
+    file.flush()
+    if DURABLE_WRITES:
+        os.fsync(file.fileno())
+        io_stats['fsyncs'] += 1
+
+
+def fsync_dir(path):
+    # переименование становится надёжным только после сброса каталога
+    if not DURABLE_WRITES or not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+        io_stats['fsyncs'] += 1
+    finally:
+        os.close(fd)
 
 
-def save_data(file_path, data):
-    with open(file_path, 'w', encoding='utf-8') as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
+def save_data(file_path, data, file_format=None, durable=True):
+    write_file(file_path, encode_data(data, file_format or data_format(file_path)), durable)
+
+
+def write_file(file_path, raw, durable=True):
+    # пишем во временный файл рядом и атомарно подменяем: при сбое остаётся старая версия целиком
+    tmp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(raw)
+            if durable:
+                fsync_file(file)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if durable:
+        fsync_dir(file_path)
+    io_stats['writes'] += 1
+    io_stats['bytes'] += len(raw)
 
 
 def load_data(file_path, default_data):
     if not os.path.exists(file_path):
         save_data(file_path, default_data)
         return default_data
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    with open(file_path, 'rb') as file:
+        raw = file.read()
+    io_stats['reads'] += 1
+    io_stats['bytes_read'] += len(raw)
+    return decode_data(raw)
+
+
+STORAGE_BACKEND = os.environ.get('PA_STORAGE', 'json')
+FINANCE_PARTITIONS = os.environ.get('PA_FINANCE_PARTITIONS') == '1'  # финансы по месяцам, см. PartitionedStorage
+JOURNAL_COMPACT_THRESHOLD = 1000  # число записей в журнале, после которого запускается сжатие
+
+
+class GroupCommit:
+    # изменения, пришедшие в пределах окна, фиксируются одной записью на хранилище
+    def __init__(self, window):
+        self.window = window
+        self.pending = {}
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def schedule(self, storage):
+        with self.lock:
+            self.pending[id(storage)] = storage
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            storages = list(self.pending.values())
+            self.pending.clear()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        for storage in storages:
+            storage.flush()
+
+
+group_commit = GroupCommit(GROUP_COMMIT_WINDOW)
+
+
+def flush():
+    group_commit.flush()
+
+
+atexit.register(flush)
+
+
+def io_rates():
+    elapsed = time.perf_counter() - PROCESS_START
+    return {
+        'writes_per_sec': io_stats['writes'] / elapsed,
+        'fsyncs_per_sec': io_stats['fsyncs'] / elapsed,
+        'bytes_written': io_stats['bytes'],
+        'reads_per_sec': io_stats['reads'] / elapsed,
+        'bytes_read': io_stats['bytes_read'],
+    }
+
+
+class StoreLock:
+    # блокировка хранилища между потоками процесса и, если задан путь, между процессами
+    # (flock на файле <путь>.lock); повторный вход тем же потоком разрешён
+    def __init__(self, path=None):
+        self.path = path + '.lock' if path is not None and fcntl is not None else None
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0 and self.path is not None:
+            try:
+                self.file = open(self.path, 'a')
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            except BaseException:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0 and self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+
+class Storage:
+    # общая часть хранилищ: свои изменения, ещё не записанные на диск (pending),
+    # и чужие, ещё не применённые менеджером (incoming, None — запись удалена)
+    def __init__(self, key_field, snapshot):
+        self.key_field = key_field
+        self.snapshot = snapshot
+        self.meta = {}
+        self.replayed = 0  # операции из журнала, применённые поверх снимка при загрузке
+        self.stale = False  # производные данные в meta (итоги) не учитывают изменений других процессов
+        self.version = 0
+        self.pending = set()
+        self.incoming = {}
+        self.on_change = None
+        self.batch_depth = 0
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # внешняя транзакция начинается с подтягивания чужих изменений и заканчивается публикацией своих
+        with self.lock:
+            outer = self.lock.depth == 1
+            if outer:
+                self.pull()
+            yield self
+            if outer:
+                self.publish()
+
+    @contextlib.contextmanager
+    def batch(self):
+        # внутри пакета изменения копятся в памяти и записываются один раз при выходе
+        with self.transaction():
+            self.batch_depth += 1
+            try:
+                yield self
+            finally:
+                self.batch_depth -= 1
+                if not self.batch_depth:
+                    self.flush()
+
+    def current(self):
+        items = {item[self.key_field]: item for item in self.snapshot()}
+        for key, item in self.incoming.items():
+            if key in self.pending:
+                continue
+            if item is None:
+                items.pop(key, None)
+            else:
+                items[key] = item
+        return items
+
+    def merge(self, items):
+        # сравнение по записям: свои незаписанные изменения побеждают, остальное берётся с диска
+        current = self.current()
+        for item in items:
+            key = item[self.key_field]
+            if key not in self.pending and current.pop(key, None) != item:
+                self.incoming[key] = item
+        for key in current:
+            if key not in self.pending:
+                self.incoming[key] = None
+
+    def written(self):
+        for key in self.pending:
+            self.incoming.pop(key, None)
+        self.pending.clear()
+
+    def refresh(self):
+        with self.lock:
+            self.pull()
+            changes = {key: item for key, item in self.incoming.items() if key not in self.pending}
+            self.incoming.clear()
+        if changes and self.on_change is not None:
+            self.on_change([item for item in changes.values() if item is not None],
+                           [key for key, item in changes.items() if item is None])
+        return len(changes)
+
+
+class JsonStorage(Storage):
+    def __init__(self, file_path, key_field, snapshot):
+        super().__init__(key_field, snapshot)
+        self.file_path = file_path
+        self.meta_path = os.path.splitext(file_path)[0] + '.meta.json'
+        self.stamp = None
+        self.dirty = False
+        self.reserved = False
+        self.lock = StoreLock(file_path)
+
+    def watched_files(self):
+        return self.file_path, self.meta_path
+
+    def file_stamp(self):
+        stamp = []
+        for path in self.watched_files():
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return stamp
+
+    def changed(self):
+        # файлы изменил кто-то другой: наши собственные записи обновляют отметку
+        return self.file_stamp() != self.stamp
+
+    def load(self):
+        with self.lock:
+            self.meta = load_data(self.meta_path, {})
+            data = load_data(self.file_path, [])
+            self.stamp = self.file_stamp()
+        self.version = self.meta.get('version', 0)
+        self.stale = self.meta.pop('stale', False)
+        return data
+
+    def pull(self):
+        if not self.changed():
+            return
+        meta = self.pull_meta()
+        if meta.get('version', 0) != self.version:
+            self.merge(load_data(self.file_path, []))
+            self.version = meta.get('version', 0)
+        self.stamp = self.file_stamp()
+
+    def pull_meta(self):
+        meta = load_data(self.meta_path, {})
+        self.meta['next_id'] = max(self.meta.get('next_id', 1), meta.get('next_id', 1))
+        return meta
+
+    def reserve_id(self):
+        new_id = self.meta.get('next_id', 1)
+        self.meta['next_id'] = new_id + 1
+        self.reserved = True
+        return new_id
+
+    def publish(self):
+        # Выданные ID должны быть видны другим процессам, даже если сами записи ждут групповой фиксации.
+        # Если снимок (или журнал) уже записан в этой транзакции, next_id ушёл вместе с ним
+        if self.reserved:
+            self.reserved = False
+            meta = load_data(self.meta_path, {})
+            meta['next_id'] = max(meta.get('next_id', 1), self.meta['next_id'])
+            save_data(self.meta_path, meta, durable=False)
+            self.stamp = self.file_stamp()
+
+    def write(self, data):
+        self.dirty = False
+        self.reserved = False
+        self.written()
+        self.version += 1
+        meta = dict(self.meta, version=self.version)
+        if self.incoming:
+            meta['stale'] = True
+        save_data(self.file_path, data)
+        save_data(self.meta_path, meta)
+        self.stamp = self.file_stamp()
+
+    def save(self, data):
+        with self.lock:
+            self.write(data)
+
+    def put(self, item):
+        with self.lock:
+            self.pending.add(item[self.key_field])
+            self.commit()
+
+    def put_many(self, items):
+        with self.lock:
+            self.pending.update(item[self.key_field] for item in items)
+            self.commit()
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        with self.lock:
+            self.pending.update(keys)
+            self.commit()
+
+    def commit(self):
+        self.dirty = True
+        if self.batch_depth:
+            return
+        if GROUP_COMMIT_WINDOW > 0:
+            group_commit.schedule(self)
+        else:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self.pull()
+                self.write(list(self.current().values()) if self.incoming else self.snapshot())
+
+    def close(self):
+        self.flush()
+
+
+class JournalStorage(JsonStorage):
+    def __init__(self, file_path, key_field, snapshot):
+        super().__init__(file_path, key_field, snapshot)
+        self.journal_path = file_path + '.journal'
+        self.compacting_path = file_path + '.compacting'  # остаётся от прерванного сжатия прежних версий
+        self.journal = None
+        self.journal_size = 0
+        self.journal_offset = 0  # сколько байт журнала уже прочитано или записано этим процессом
+        self.compaction = None
+        self.buffer = []  # строки журнала, ещё не записанные на диск
+        atexit.register(self.close)
+
+    def load(self):
+        with self.lock:
+            self.meta = load_data(self.meta_path, {})
+            items = {}
+            for item in load_data(self.file_path, []):
+                items[item[self.key_field]] = item
+            entries, _ = self.read_journal(self.compacting_path)
+            recovered = self.replay(entries, items)
+            entries, self.journal_offset = self.read_journal(self.journal_path)
+            self.journal_size = self.replay(entries, items)
+            self.replayed = recovered + self.journal_size
+            self.version = self.meta.get('version', 0)
+            self.stale = self.meta.pop('stale', False)
+            data = list(items.values())
+            if recovered:
+                # сжатие было прервано: фиксируем восстановленное состояние в снимке
+                self.save(data)
+            self.stamp = self.file_stamp()
+        return data
+
+    def watched_files(self):
+        return self.file_path, self.meta_path, self.journal_path
+
+    def read_journal(self, path, offset=0):
+        entries = []
+        if not os.path.exists(path):
+            return entries, offset
+        start = offset
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # недописанная строка после аварийного завершения
+                try:
+                    entries.append(loads(line))
+                except ValueError:
+                    break
+                offset += len(line)
+        io_stats['reads'] += 1
+        io_stats['bytes_read'] += offset - start
+        return entries, offset
+
+    def replay(self, entries, items):
+        for entry in entries:
+            if entry['op'] == 'put':
+                key = entry['data'][self.key_field]
+                items[key] = entry['data']
+                # удалённые после снимка ID не должны выдаваться повторно
+                self.meta['next_id'] = max(self.meta.get('next_id', 1), key + 1)
+            else:
+                items.pop(entry['key'], None)
+        return len(entries)
+
+    def pull(self):
+        if not self.changed():
+            return
+        meta = self.pull_meta()
+        if meta.get('version', 0) != self.version:
+            # другой процесс записал новый снимок: сверяем состояние целиком
+            items = {item[self.key_field]: item for item in load_data(self.file_path, [])}
+            entries, self.journal_offset = self.read_journal(self.journal_path)
+            self.journal_size = self.replay(entries, items)
+            self.merge(items.values())
+            self.version = meta.get('version', 0)
+            self.close_journal()  # открытый дескриптор указывает на уже удалённый журнал
+        else:
+            # читаем только строки, дописанные другими процессами
+            entries, self.journal_offset = self.read_journal(self.journal_path, self.journal_offset)
+            self.journal_size += len(entries)
+            for entry in entries:
+                if entry['op'] == 'put':
+                    key = entry['data'][self.key_field]
+                    self.meta['next_id'] = max(self.meta.get('next_id', 1), key + 1)
+                    if key not in self.pending:
+                        self.incoming[key] = entry['data']
+                elif entry['key'] not in self.pending:
+                    self.incoming[entry['key']] = None
+        self.stamp = self.file_stamp()
+
+    def append(self, entries, keys):
+        lines = [dumps_compact(entry) + b'\n' for entry in entries]
+        with self.lock:
+            self.buffer.extend(lines)
+            self.pending.update(keys)
+            self.commit()
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            self.pull()
+            self.write_buffer()
+        if self.journal_size >= JOURNAL_COMPACT_THRESHOLD:
+            self.compact()
+
+    def write_buffer(self):
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'ab')
+        self.journal.truncate(self.journal_offset)  # отрезаем недописанную строку упавшего процесса
+        raw = b''.join(self.buffer)
+        self.journal.write(raw)
+        fsync_file(self.journal)
+        io_stats['writes'] += 1
+        io_stats['bytes'] += len(raw)
+        self.journal_offset += len(raw)
+        self.journal_size += len(self.buffer)
+        self.buffer.clear()
+        self.dirty = False
+        self.reserved = False  # ID восстанавливаются из записей журнала
+        self.written()
+        self.stamp = self.file_stamp()
+
+    def put(self, item):
+        self.append([{'op': 'put', 'data': item}], [item[self.key_field]])
+
+    def put_many(self, items):
+        self.append([{'op': 'put', 'data': item} for item in items], [item[self.key_field] for item in items])
+
+    def delete(self, key):
+        self.append([{'op': 'delete', 'key': key}], [key])
+
+    def delete_many(self, keys):
+        self.append([{'op': 'delete', 'key': key} for key in keys], keys)
+
+    def save(self, data):
+        self.wait()
+        super().save(data)
+
+    def write(self, data):
+        # снимок уже содержит все изменения из буфера журнала
+        self.buffer.clear()
+        super().write(data)
+        self.close_journal()
+        for path in (self.journal_path, self.compacting_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.journal_size = 0
+        self.journal_offset = 0
+        self.stamp = self.file_stamp()
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def compact(self):
+        if self.compaction is not None and self.compaction.is_alive():
+            return
+        self.compaction = threading.Thread(target=self.write_compacted, daemon=True)
+        self.compaction.start()
+
+    def write_compacted(self):
+        # буфер сначала дописывается в журнал: если процесс упадёт до удаления журнала,
+        # его повторное применение к новому снимку ничего не изменит
+        with self.lock:
+            self.pull()
+            if self.buffer:
+                self.write_buffer()
+            self.write(list(self.current().values()))
+
+    def wait(self):
+        if self.compaction is not None and self.compaction is not threading.current_thread():
+            self.compaction.join()
+            self.compaction = None
+
+    def close(self):
+        self.flush()
+        self.wait()
+        with self.lock:
+            self.close_journal()
+
+
+UNDATED_PARTITION = 'undated'
+
+
+@functools.lru_cache(maxsize=8192)
+def partition_of(date):
+    # ГГГГ-ММ; записи с некорректной датой лежат в отдельной партиции
+    if date_ordinal(date) is None:
+        return UNDATED_PARTITION
+    return f'{date[6:]}-{date[3:5]}'
+
+
+def partition_bounds(partition):
+    # порядковые номера первого дня месяца и первого дня следующего
+    year, month = map(int, partition.split('-'))
+    return datetime.date(year, month, 1).toordinal(), datetime.date(year + month // 12, month % 12 + 1, 1).toordinal()
+
+
+def partition_summary(items):
+    summary = {'count': 0, 'income': 0, 'expense': 0, 'categories': {}}  # категория -> [сумма, число записей]
+    for item in items:
+        amount = item['amount']
+        summary['count'] += 1
+        summary['income' if amount > 0 else 'expense'] += amount
+        add_to_bucket(summary['categories'], item['category'], (amount, 1))
+    return summary
+
+
+class PartitionedStorage(JsonStorage):
+    # Записи лежат по месяцам в каталоге <имя>.parts: файл на каждый ГГГГ-ММ и манифест с итогами месяцев.
+    # Без полной загрузки (load) читаются только манифест и нужные партиции; фиксация переписывает
+    # лишь партиции изменённых записей
+    def __init__(self, file_path, key_field, snapshot, date_field='date'):
+        super().__init__(file_path, key_field, snapshot)
+        self.directory = os.path.splitext(file_path)[0] + '.parts'
+        self.meta_path = os.path.join(self.directory, 'manifest.json')
+        self.date_field = date_field
+        self.locations = {}  # ключ -> партиция, в которой запись лежит на диске
+        self.touched = set()  # партиции, которые перепишет следующая фиксация
+        self.cache = {}  # партиции, прочитанные без полной загрузки
+        self.loaded = False
+
+    def watched_files(self):
+        return (self.meta_path,)  # любая фиксация переписывает манифест
+
+    def partition_path(self, partition):
+        return os.path.join(self.directory, partition + '.json')
+
+    def partitions(self):
+        return self.meta.setdefault('partitions', {})
+
+    def open(self):
+        with self.lock:
+            if not os.path.exists(self.meta_path):
+                self.migrate()
+            # полная загрузка может начаться посреди транзакции: уже выданные ID терять нельзя
+            next_id = self.meta.get('next_id', 1)
+            self.meta = load_data(self.meta_path, {})
+            self.meta['next_id'] = max(self.meta.get('next_id', 1), next_id)
+            self.version = self.meta.get('version', 0)
+            self.stamp = self.file_stamp()
+
+    def migrate(self):
+        # первый запуск: записи из единого файла (и его журнала) раскладываются по месяцам. Старые файлы
+        # переименовываются в *.migrated, чтобы без PA_FINANCE_PARTITIONS не показывались устаревшие данные
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.file_path) or os.path.exists(self.file_path + '.journal'):
+            source = JournalStorage(self.file_path, self.key_field, list)
+            source.lock = self.lock
+            data = source.load()
+            self.meta = {'next_id': source.meta.get('next_id', 1)}
+            restore_next_id(self, [item[self.key_field] for item in data])
+            self.write(data)
+            for path in source.watched_files():
+                if os.path.exists(path):
+                    os.replace(path, path + '.migrated')
+
+    def load(self):
+        with self.lock:
+            self.open()
+            data = []
+            self.locations = {}
+            for partition in self.partitions():
+                items = self.read_partition(partition)
+                for item in items:
+                    self.locations[item[self.key_field]] = partition
+                data.extend(items)
+            self.cache.clear()
+            self.loaded = True
+        return data
+
+    def read_partition(self, partition):
+        items = self.cache.get(partition)
+        if items is None:
+            items = self.cache[partition] = load_data(self.partition_path(partition), [])
+        return items
+
+    def pull(self):
+        if not self.changed():
+            return
+        manifest = self.pull_meta()
+        if manifest.get('version', 0) != self.version:
+            old, new = self.partitions(), manifest.get('partitions', {})
+            changed = [partition for partition in set(old) | set(new)
+                       if old.get(partition, {}).get('version') != new.get(partition, {}).get('version')]
+            for partition in changed:
+                self.cache.pop(partition, None)
+            self.meta['partitions'] = new
+            self.version = manifest.get('version', 0)
+            if self.loaded:
+                self.merge_partitions(changed)
+        self.stamp = self.file_stamp()
+
+    def merge_partitions(self, partitions):
+        # то же сравнение по записям, что и merge, но только в партициях, которые переписал другой процесс
+        current = {}
+        for partition in partitions:
+            for item in self.snapshot(partition):
+                current[item[self.key_field]] = item
+        for key, item in self.incoming.items():
+            if item is not None and partition_of(item[self.date_field]) in partitions:
+                current[key] = item
+            else:
+                current.pop(key, None)
+        seen = {}
+        for partition in partitions:
+            for item in load_data(self.partition_path(partition), []):
+                seen[item[self.key_field]] = item
+                self.locations[item[self.key_field]] = partition
+        for key, item in seen.items():
+            if key not in self.pending and current.get(key) != item:
+                self.incoming[key] = item
+        for key in current:
+            if key not in seen:
+                if self.locations.get(key) in partitions:
+                    del self.locations[key]
+                if key not in self.pending:
+                    self.incoming[key] = None
+
+    def put(self, item):
+        self.put_many([item])
+
+    def put_many(self, items):
+        with self.lock:
+            for item in items:
+                key = item[self.key_field]
+                self.pending.add(key)
+                self.touched.add(partition_of(item[self.date_field]))
+                if key in self.locations:
+                    self.touched.add(self.locations[key])
+            self.commit()
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.pending.add(key)
+                if key in self.locations:
+                    self.touched.add(self.locations[key])
+            self.commit()
+
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self.pull()
+                self.write_partitions(self.touched)
+
+    def partition_items(self, partition):
+        # содержимое партиции с учётом ещё не применённых чужих изменений
+        items = {item[self.key_field]: item for item in self.snapshot(partition)}
+        for key, item in self.incoming.items():
+            if key in self.pending:
+                continue
+            if item is not None and partition_of(item[self.date_field]) == partition:
+                items[key] = item
+            else:
+                items.pop(key, None)
+        return list(items.values())
+
+    def write_partitions(self, partitions):
+        self.version += 1
+        for key in self.pending:
+            if self.locations.get(key) in partitions:
+                del self.locations[key]
+        for partition in partitions:
+            items = self.partition_items(partition)
+            self.write_partition(partition, items)
+            for item in items:
+                self.locations[item[self.key_field]] = partition
+        self.dirty = False
+        self.touched = set()
+        self.written()
+        self.save_manifest()
+
+    def write_partition(self, partition, items):
+        path = self.partition_path(partition)
+        if items:
+            save_data(path, items)
+            self.partitions()[partition] = dict(partition_summary(items), version=self.version)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            self.partitions().pop(partition, None)
+
+    def write(self, data):
+        # полная перезапись: все партиции заново, лишние файлы удаляются
+        self.version += 1
+        groups = {}
+        for item in data:
+            groups.setdefault(partition_of(item[self.date_field]), []).append(item)
+        for partition in set(self.partitions()) - set(groups):
+            self.write_partition(partition, [])
+        self.locations = {}
+        for partition, items in groups.items():
+            self.write_partition(partition, items)
+            for item in items:
+                self.locations[item[self.key_field]] = partition
+        self.cache.clear()
+        self.dirty = False
+        self.touched = set()
+        self.written()
+        self.save_manifest()
+
+    def save_manifest(self):
+        # итоги менеджера (totals) в манифест не попадают: он хранит только итоги по месяцам
+        manifest = {key: value for key, value in self.meta.items() if key != 'totals'}
+        manifest['version'] = self.version
+        save_data(self.meta_path, manifest)
+        self.reserved = False
+        self.stamp = self.file_stamp()
+
+
+SQLITE_FILE = 'assistant.db'
+
+# Для каждого хранилища: имя таблицы, колонки для запросов (тип, функция извлечения) и индексы.
+# Колонки нужны только под запросы query_records: остальные выборки идут по индексам в памяти,
+# а каждая лишняя колонка и индекс удорожают запись. DROP убирает индексы, созданные прежними версиями
+SQLITE_TABLES = {
+    NOTES_FILE: ('notes', {}, []),
+    TASKS_FILE: ('tasks', {}, ['DROP INDEX IF EXISTS tasks_due']),
+    CONTACTS_FILE: ('contacts', {}, ['DROP INDEX IF EXISTS contacts_phone']),
+    FINANCE_FILE: ('finance', {
+        'category_key': ('TEXT', lambda item: item['category'].lower()),
+        'date': ('TEXT', lambda item: item['date']),
+    }, [
+        'DROP INDEX IF EXISTS finance_date',
+        'CREATE INDEX IF NOT EXISTS finance_day ON finance (date)',
+        'CREATE INDEX IF NOT EXISTS finance_category ON finance (category_key)',
+    ]),
+}
+
+sqlite_connections = {}
+sqlite_lock = StoreLock()  # соединения общие для всех хранилищ и потока групповой фиксации
+
+
+def sqlite_connection(db_path=SQLITE_FILE):
+    connection = sqlite_connections.get(db_path)
+    if connection is None:
+        connection = sqlite3.connect(db_path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        sqlite_connections[db_path] = connection
+    return connection
+
+
+class SqliteStorage(Storage):
+    def __init__(self, file_path, key_field, snapshot, db_path=SQLITE_FILE):
+        super().__init__(key_field, snapshot)
+        self.table, self.columns, indexes = SQLITE_TABLES[file_path]
+        self.connection = sqlite_connection(db_path)
+        self.lock = sqlite_lock
+        column_defs = ''.join(f', {name} {sql_type}' for name, (sql_type, _) in self.columns.items())
+        with self.lock, self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY, data TEXT NOT NULL{column_defs})')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (store TEXT PRIMARY KEY, data TEXT NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS ids (store TEXT PRIMARY KEY, next_id INTEGER NOT NULL)')
+            for statement in indexes:
+                self.connection.execute(statement)
+        names = ['id', 'data'] + list(self.columns)
+        self.insert_sql = (f'INSERT OR REPLACE INTO {self.table} ({", ".join(names)}) '
+                           f'VALUES ({", ".join("?" * len(names))})')
+        self.data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def row(self, item):
+        values = [item[self.key_field], dumps_compact(item).decode('utf-8')]
+        values.extend(extract(item) for _, extract in self.columns.values())
+        return values
+
+    def load(self):
+        with self.lock:
+            row = self.connection.execute('SELECT data FROM meta WHERE store = ?', (self.table,)).fetchone()
+            self.meta = loads(row[0]) if row else {}
+            self.data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+            data = self.select()
+        self.version = self.meta.get('version', 0)
+        self.stale = self.meta.pop('stale', False)
+        return data
+
+    def changed(self):
+        # data_version меняется только после коммитов других соединений
+        return self.connection.execute('PRAGMA data_version').fetchone()[0] != self.data_version
+
+    def select(self, where='1', params=()):
+        cursor = self.connection.execute(f'SELECT data FROM {self.table} WHERE {where} ORDER BY id', params)
+        return [loads(data) for data, in cursor]
+
+    def stored_meta(self):
+        row = self.connection.execute(
+            "SELECT json_extract(data, '$.next_id'), json_extract(data, '$.version') FROM meta WHERE store = ?",
+            (self.table,)).fetchone()
+        next_id, version = row if row else (None, None)
+        self.meta['next_id'] = max(self.meta.get('next_id', 1), next_id or 1)
+        return version or 0
+
+    def pull(self):
+        if not self.changed():
+            return
+        # коммиты в другие таблицы тоже меняют data_version, поэтому сверяем версию этого хранилища
+        version = self.stored_meta()
+        if version != self.version:
+            self.merge(self.select())
+            self.version = version
+        self.data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def save_meta(self):
+        # вызывается внутри пишущей транзакции: чтение и запись meta не перемешиваются с другими процессами
+        self.version = self.stored_meta() + 1
+        meta = dict(self.meta, version=self.version)
+        if self.incoming or self.changed():
+            meta['stale'] = True
+        self.connection.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                (self.table, dumps_compact(meta).decode('utf-8')))
+
+    def reserve_id(self):
+        # счётчик ID лежит отдельной строкой: выдача ID не переписывает meta с итогами
+        if not self.connection.in_transaction:
+            self.connection.execute('BEGIN IMMEDIATE')
+        row = self.connection.execute('SELECT next_id FROM ids WHERE store = ?', (self.table,)).fetchone()
+        new_id = max(self.meta.get('next_id', 1), row[0] if row else 1)
+        self.meta['next_id'] = new_id + 1
+        self.connection.execute('INSERT OR REPLACE INTO ids VALUES (?, ?)', (self.table, new_id + 1))
+        return new_id
+
+    def publish(self):
+        self.commit()
+
+    def save(self, data):
+        with self.lock, self.connection:
+            self.connection.execute(f'DELETE FROM {self.table}')
+            self.connection.executemany(self.insert_sql, (self.row(item) for item in data))
+            self.save_meta()
+            self.written()
+        io_stats['writes'] += 1
+
+    def put(self, item):
+        with self.lock:
+            self.connection.execute(self.insert_sql, self.row(item))
+            self.pending.add(item[self.key_field])
+            self.save_meta()
+            self.commit()
+
+    def put_many(self, items):
+        with self.lock:
+            self.connection.executemany(self.insert_sql, (self.row(item) for item in items))
+            self.pending.update(item[self.key_field] for item in items)
+            self.save_meta()
+            self.commit()
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        with self.lock:
+            self.connection.executemany(f'DELETE FROM {self.table} WHERE id = ?', ((key,) for key in keys))
+            self.pending.update(keys)
+            self.save_meta()
+            self.commit()
+
+    def commit(self):
+        # транзакция остаётся открытой до конца пакета или окна и фиксируется одним коммитом
+        if self.batch_depth:
+            return
+        if GROUP_COMMIT_WINDOW > 0:
+            group_commit.schedule(self)
+        else:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.connection.in_transaction:
+                self.connection.commit()
+                self.written()
+                io_stats['writes'] += 1
+
+    def close(self):
+        self.flush()
+
+
+def migrate_to_sqlite(db_path=SQLITE_FILE):
+    key_fields = {NOTES_FILE: 'note_id', TASKS_FILE: 'task_id', CONTACTS_FILE: 'contact_id', FINANCE_FILE: 'record_id'}
+    for file_path, key_field in key_fields.items():
+        if not os.path.exists(file_path):
+            continue
+        source = JournalStorage(file_path, key_field, list)
+        data = source.load()
+        target = SqliteStorage(file_path, key_field, list, db_path)
+        target.meta = source.meta
+        target.save(data)
+        print(f'Файл {file_path} перенесён в {db_path}: {len(data)} записей')
+
+
+STORAGE_BACKENDS = {
+    'json': JsonStorage,
+    'journal': JournalStorage,
+    'sqlite': SqliteStorage,
+}
+
+
+def create_storage(file_path, key_field, snapshot):
+    backend = STORAGE_BACKENDS.get(STORAGE_BACKEND)
+    if backend is None:
+        raise ValueError(f'Неизвестный тип хранилища: {STORAGE_BACKEND}')
+    return backend(file_path, key_field, snapshot)
+
+
+def allocate_id(storage):
+    # ID выдаются под блокировкой хранилища, поэтому разные процессы не получат одинаковых
+    with storage.transaction():
+        return storage.reserve_id()
+
+
+def restore_next_id(storage, items):
+    storage.meta['next_id'] = max(storage.meta.get('next_id', 1), max(items, default=0) + 1)
 
 
 def is_valid_date(date_str):
@@ -30,47 +1102,610 @@ def is_valid_date(date_str):
         return False
 
 
+def read_choice(prompt):
+    # некорректный ввод не роняет меню: такой номер просто не совпадёт ни с одним пунктом
+    try:
+        return int(input(prompt))
+    except ValueError:
+        return None
+
+
+DATE_CACHE_SIZE = 8192  # различных дат немного, а strptime на каждую запись заметно замедляет загрузку
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def date_ordinal(date_str):
+    try:
+        return datetime.datetime.strptime(date_str, '%d-%m-%Y').toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def date_key(date_str):
+    try:
+        date = datetime.datetime.strptime(date_str, '%d-%m-%Y')
+    except (TypeError, ValueError):
+        return None
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def checked_ordinal(date_str):
+    # для публичных методов с диапазоном дат: ошибка вместо сравнения с None в глубине индекса
+    ordinal = date_ordinal(date_str)
+    if ordinal is None:
+        raise ValueError(f'Некорректная дата {date_str!r}. Используйте ДД-ММ-ГГГГ.')
+    return ordinal
+
+
+IMPORT_BATCH_SIZE = 10000
+MAX_REPORTED_REJECTS = 100  # сколько отклонённых строк держать в памяти для вывода
+
+
+class ImportReport:
+    def __init__(self, file_name, rejected_file=None):
+        self.file_name = file_name
+        self.processed = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.rejected_file = rejected_file
+        self.rejected_writer = None
+        self.rejected_stream = None
+
+    def reject(self, line_number, reason, row):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_REJECTS:
+            self.errors.append((line_number, reason))
+        if self.rejected_file:
+            if self.rejected_writer is None:
+                self.rejected_stream = open(self.rejected_file, 'w', newline='', encoding='utf-8')
+                self.rejected_writer = csv.writer(self.rejected_stream)
+                self.rejected_writer.writerow(['Строка', 'Ошибка'] + list(row))
+            self.rejected_writer.writerow([line_number, reason] + list(row.values()))
+
+    def close(self):
+        if self.rejected_stream is not None:
+            self.rejected_stream.close()
+
+    def print_summary(self):
+        print(f'Обработано строк: {self.processed}, импортировано: {self.imported}, отклонено: {self.rejected}')
+        for line_number, reason in self.errors[:10]:
+            print(f'Строка {line_number}: {reason}')
+        if self.rejected_writer is not None:
+            print(f'Отклонённые строки сохранены в файл {self.rejected_file}')
+
+
+def open_csv(file_name, mode):
+    # файлы .csv.gz сжимаются и читаются прозрачно
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, mode + 't', newline='', encoding='utf-8', compresslevel=EXPORT_GZIP_LEVEL)
+    return open(file_name, mode, newline='', encoding='utf-8')
+
+
+def read_csv_rows(file_name):
+    with open_csv(file_name, 'r') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def row_value(row, column, default=None):
+    # колонки нет в файле — значение по умолчанию (без него колонка обязательна);
+    # в короткой строке DictReader подставляет None, такая строка отклоняется
+    if column not in row:
+        if default is None:
+            raise KeyError(column)
+        return default
+    value = row[column]
+    if value is None:
+        raise ValueError(f'нет значения в колонке {column}')
+    return value
+
+
+def convert_rows(rows, convert, report):
+    for line_number, row in rows:
+        report.processed += 1
+        try:
+            yield convert(row)
+        except KeyError as error:
+            report.reject(line_number, f'нет колонки {error}', row)
+        except ValueError as error:
+            report.reject(line_number, str(error), row)
+
+
+def batched(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_csv(file_name, convert, commit, batch_size=IMPORT_BATCH_SIZE, progress=None, rejected_file=None):
+    report = ImportReport(file_name, rejected_file)
+    try:
+        for batch in batched(convert_rows(read_csv_rows(file_name), convert, report), batch_size):
+            commit(batch)
+            report.imported += len(batch)
+            if progress:
+                progress(report)
+    finally:
+        report.close()
+    return report
+
+
+EXPORT_GZIP_LEVEL = 6  # уровень 9 сжимает почти так же, но заметно медленнее
+EXPORT_WORKERS = 4
+
+
+class ExportReport:
+    def __init__(self):
+        self.files = []
+        self.rows = 0
+        self.bytes = 0  # объём CSV до сжатия
+        self.disk_bytes = 0
+        self.seconds = 0
+
+    def target(self):
+        return self.files[0] if len(self.files) == 1 else f'{self.files[0]} … {self.files[-1]}'
+
+    def throughput(self):
+        # мегабайт CSV в секунду; при сжатии на диск попадает меньше
+        return self.bytes / 2 ** 20 / self.seconds if self.seconds else 0
+
+    def print_summary(self):
+        print(f'Выгружено строк: {self.rows}, файлов: {len(self.files)}, {self.bytes / 2 ** 20:.1f} МБ '
+              f'({self.disk_bytes / 2 ** 20:.1f} МБ на диске), {self.throughput():.1f} МБ/с')
+
+
+def chunk_file_name(file_name, number):
+    root, extension = os.path.splitext(file_name)
+    return f'{root}.{number:03d}{extension}'
+
+
+def export_csv(file_name, header, rows, compress=False, chunk_rows=None):
+    # Строки берутся из генератора и пишутся по мере чтения; при chunk_rows выгрузка делится на файлы name.001.csv, ...
+    if chunk_rows is not None and chunk_rows <= 0:
+        raise ValueError(f'Размер части должен быть положительным: {chunk_rows}')
+    report = ExportReport()
+    started = time.perf_counter()
+    rows = iter(rows)
+    row = next(rows, None)
+    while not report.files or row is not None:
+        path = chunk_file_name(file_name, len(report.files) + 1) if chunk_rows else file_name
+        if compress:
+            path += '.gz'
+        with open_csv(path, 'w') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            written = 0
+            while row is not None and (not chunk_rows or written < chunk_rows):
+                writer.writerow(row)
+                written += 1
+                row = next(rows, None)
+            file.flush()
+            report.bytes += file.buffer.tell()
+        report.rows += written
+        report.files.append(path)
+        report.disk_bytes += os.path.getsize(path)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def selected(items, predicate):
+    return items if predicate is None else (item for item in items if predicate(item))
+
+
+RESULT_CACHE_SIZE = int(os.environ.get('PA_RESULT_CACHE', '128'))  # 0 отключает кэш результатов
+
+
+class ResultCache:
+    # LRU результатов запросов; в ключ входит версия данных, поэтому после изменений старые записи
+    # не находятся и со временем вытесняются
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        if self.size > 0:
+            self.entries[key] = value
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'capacity': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / requests if requests else 0,
+        }
+
+
+def cached_result(method):
+    # версия менеджера растёт при каждом изменении записей в памяти, версия хранилища — при каждой
+    # фиксации на диске (её видит и режим без полной загрузки)
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        key = (method.__name__, args, self.version, self.storage.version)
+        return self.results.get(key, lambda: method(self, *args))
+    return wrapper
+
+
+NOTE_BLOBS_DIR = 'notes.blobs'
+NOTE_INLINE_LIMIT = 256  # тексты длиннее (в символах) хранятся отдельными файлами, в notes.json остаётся хеш
+NOTE_BLOB_COMPRESSION = os.environ.get('PA_NOTE_COMPRESS', '1') == '1'
+NOTE_BLOB_GRACE = 3600  # сборщик не трогает свежие файлы: их заметки другой процесс может ещё не записать
+BLOB_RAW = b'R'
+BLOB_ZLIB = b'Z'
+
+
+class BlobStore:
+    # файл называется SHA-256 текста, поэтому одинаковые тексты хранятся один раз
+    def __init__(self, directory, compress=NOTE_BLOB_COMPRESSION):
+        self.directory = directory
+        self.compress = compress
+
+    def path(self, blob):
+        return os.path.join(self.directory, blob[:2], blob)
+
+    def put(self, text):
+        raw = text.encode('utf-8')
+        blob = hashlib.sha256(raw).hexdigest()
+        path = self.path(blob)
+        if os.path.exists(path):
+            os.utime(path)  # файл снова нужен, сборщик его не тронет
+            return blob
+        data = BLOB_RAW + raw
+        if self.compress:
+            packed = zlib.compress(raw)
+            if len(packed) < len(raw):
+                data = BLOB_ZLIB + packed
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file(path, data, DURABLE_WRITES)
+        return blob
+
+    def get(self, blob):
+        with open(self.path(blob), 'rb') as file:
+            data = file.read()
+        io_stats['reads'] += 1
+        io_stats['bytes_read'] += len(data)
+        raw = zlib.decompress(data[1:]) if data[:1] == BLOB_ZLIB else data[1:]
+        return raw.decode('utf-8')
+
+    def collect(self, live, grace=NOTE_BLOB_GRACE):
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        deadline = time.time() - grace
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name not in live and entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
+
+
 class Note:
-    def __init__(self, note_id, title, content, timestamp):
+    __slots__ = ('note_id', 'title', 'body', 'timestamp', 'blob')
+    blobs = BlobStore(NOTE_BLOBS_DIR)
+
+    def __init__(self, note_id, title, content, timestamp, blob=None):
         self.note_id = note_id
         self.title = title
-        self.content = content
+        self.body = content  # None, пока вынесенный текст не прочитан
         self.timestamp = timestamp
+        self.blob = blob
+
+    @property
+    def content(self):
+        if self.body is None:
+            self.body = self.blobs.get(self.blob)
+        return self.body
+
+    @content.setter
+    def content(self, content):
+        self.body = content
+        self.blob = None
+
+    def unload(self):
+        # вынесенный текст всегда можно перечитать
+        if self.blob is not None:
+            self.body = None
+
+    def to_dict(self):
+        return {
+            'note_id': self.note_id,
+            'title': self.title,
+            'content': self.content,
+            'timestamp': self.timestamp,
+        }
+
+    def to_record(self):
+        # запись для notes.json: длинный текст уходит в хранилище блоков
+        if self.blob is None and len(self.body) > NOTE_INLINE_LIMIT:
+            self.blob = self.blobs.put(self.body)
+        if self.blob is None:
+            return self.to_dict()
+        return {'note_id': self.note_id, 'title': self.title, 'blob': self.blob, 'timestamp': self.timestamp}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['note_id'], data['title'], data.get('content'), data['timestamp'], data.get('blob'))
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2  # слово из заголовка считается за несколько вхождений
+PREFIX_WEIGHT = 0.5  # совпадение по префиксу весит меньше точного
+MAX_PREFIX_EXPANSION = 50
+NOTE_INDEX_LOG_LIMIT = 1000  # изменений в журнале индекса, после которых индекс переписывается целиком
+
+
+def fold_text(text):
+    # NFC склеивает «и» с кратким знаком, иначе \w разрежет «й» на части
+    return unicodedata.normalize('NFC', text).casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(fold_text(text))
+
+
+class NoteSearchIndex:
+    def __init__(self):
+        self.documents = {}  # note_id -> {токен: частота}
+        self.postings = {}  # токен -> {note_id: частота}
+        self.lengths = {}
+        self.total_length = 0
+        self.vocabulary = None  # отсортированный список токенов для поиска по префиксу, строится лениво
+        self.saved = False  # файл индекса (с журналом) совпадает с состоянием до changes
+        self.changes = {}  # note_id -> термы или None: изменения, ещё не дописанные в журнал
+        self.log_size = 0
+
+    def add(self, note):
+        terms = {}
+        for token in tokenize(note.title):
+            terms[token] = terms.get(token, 0) + TITLE_WEIGHT
+        for token in tokenize(note.content):
+            terms[token] = terms.get(token, 0) + 1
+        self.add_document(note.note_id, terms)
+        if self.saved:
+            self.changes[note.note_id] = terms
+
+    def add_document(self, note_id, terms):
+        self.documents[note_id] = terms
+        length = sum(terms.values())
+        self.lengths[note_id] = length
+        self.total_length += length
+        for token, count in terms.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                self.vocabulary = None
+            postings[note_id] = count
+
+    def remove(self, note_id):
+        terms = self.documents.pop(note_id, None)
+        if terms is None:
+            return
+        if self.saved:
+            self.changes[note_id] = None
+        self.total_length -= self.lengths.pop(note_id)
+        for token in terms:
+            postings = self.postings[token]
+            del postings[note_id]
+            if not postings:
+                del self.postings[token]
+                self.vocabulary = None
+
+    def expand(self, token):
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, token)
+        for term in itertools.islice(self.vocabulary, start, start + MAX_PREFIX_EXPANSION):
+            if not term.startswith(token):
+                break
+            yield term
+
+    def search(self, query, limit=20):
+        tokens = set(tokenize(query))
+        if not tokens or not self.documents:
+            return []
+        count = len(self.documents)
+        average_length = self.total_length / count or 1
+        scores = {}
+        matched = {}
+        scanned = 0
+        for token in tokens:
+            token_scores = {}
+            for term in self.expand(token):
+                postings = self.postings[term]
+                scanned += len(postings)
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                weight = idf if term == token else idf * PREFIX_WEIGHT
+                for note_id, frequency in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[note_id] / average_length)
+                    score = weight * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    token_scores[note_id] = max(token_scores.get(note_id, 0), score)
+            for note_id, score in token_scores.items():
+                scores[note_id] = scores.get(note_id, 0) + score
+                matched[note_id] = matched.get(note_id, 0) + 1
+        record_scan('NoteSearchIndex.search', scanned)
+        # заметка должна содержать все слова запроса (полностью или по префиксу)
+        results = [note_id for note_id in scores if matched[note_id] == len(tokens)]
+        results.sort(key=lambda note_id: -scores[note_id])
+        return results[:limit]
+
+    def save(self, file_path, stamp):
+        # индекс — кэш: если он прочитан с диска, изменения дописываются в журнал <файл>.log
+        # с отпечатком заметок в конце, целиком (компактно и без fsync) он переписывается редко
+        log_path = file_path + '.log'
+        if self.saved and self.log_size + len(self.changes) < NOTE_INDEX_LOG_LIMIT:
+            lines = [dumps_compact({'id': note_id, 'terms': terms}) + b'\n' for note_id, terms in self.changes.items()]
+            lines.append(dumps_compact({'stamp': stamp}) + b'\n')
+            with open(log_path, 'ab') as file:
+                file.write(b''.join(lines))
+            self.log_size += len(lines)
+        else:
+            save_data(file_path, {'stamp': stamp, 'documents': self.documents}, 'compact', durable=False)
+            if os.path.exists(log_path):
+                os.remove(log_path)
+            self.log_size = 0
+        self.changes.clear()
+        self.saved = True
+
+    def load(self, file_path, stamp):
+        if not os.path.exists(file_path):
+            return False
+        data = load_data(file_path, {})
+        saved_stamp = data.get('stamp')
+        documents = {int(note_id): terms for note_id, terms in data.get('documents', {}).items()}
+        entries = []
+        if os.path.exists(file_path + '.log'):
+            with open(file_path + '.log', 'rb') as file:
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break  # недописанная строка: отпечаток после неё не сохранился, индекс перестроится
+                    try:
+                        entries.append(loads(line))
+                    except ValueError:
+                        break
+        for entry in entries:
+            if 'stamp' in entry:
+                saved_stamp = entry['stamp']
+                continue
+            saved_stamp = None  # изменения действительны только вместе с отпечатком, записанным после них
+            if entry['terms'] is None:
+                documents.pop(entry['id'], None)
+            else:
+                documents[entry['id']] = entry['terms']
+        if saved_stamp != stamp:
+            return False
+        for note_id, terms in documents.items():
+            self.add_document(note_id, terms)
+        self.saved = True
+        self.log_size = len(entries)
+        return True
 
 
 class NoteManager:
     def __init__(self):
-        self.notes = []
+        self.notes = {}
+        self.storage = create_storage(NOTES_FILE, 'note_id', self.dump_notes)
+        self.storage.on_change = self.apply_changes
+        self.index_file = NOTES_INDEX_FILE
+        self.index_dirty = False
         self.load_notes()
+        atexit.register(self.save_search_index)
 
     def load_notes(self):
-        data = load_data(NOTES_FILE, [])
-        self.notes = [Note(**note) for note in data]
+        data = self.storage.load()
+        self.notes = {}
+        inline = []
+        for item in data:
+            note = Note.from_dict(item)
+            self.notes[note.note_id] = note
+            if note.blob is None and len(note.body) > NOTE_INLINE_LIMIT:
+                inline.append(note)
+        restore_next_id(self.storage, self.notes)
+        self.search_index = NoteSearchIndex()
+        if not self.search_index.load(self.index_file, self.index_stamp()):
+            for note in self.notes.values():
+                self.search_index.add(note)
+                note.unload()
+            self.index_dirty = True
+        if inline:
+            # заметки в старом формате: длинные тексты переносятся из notes.json в хранилище блоков
+            self.storage.put_many(self.records(inline))
+
+    def index_stamp(self):
+        # отпечаток набора заметок: по нему сохранённый индекс проверяется на актуальность
+        stamp = 0
+        for note in self.notes.values():
+            stamp = zlib.crc32(f'{note.note_id}:{note.timestamp}:{note.title}'.encode('utf-8'), stamp)
+        return [len(self.notes), stamp]
+
+    def save_search_index(self):
+        if self.index_dirty:
+            self.search_index.save(self.index_file, self.index_stamp())
+            self.index_dirty = False
+
+    def apply_changes(self, items, deleted):
+        # изменения, записанные другими процессами
+        for note_id in deleted:
+            if self.notes.pop(note_id, None) is not None:
+                self.search_index.remove(note_id)
+        for item in items:
+            note = Note.from_dict(item)
+            if note.note_id in self.notes:
+                self.search_index.remove(note.note_id)
+            self.notes[note.note_id] = note
+            self.search_index.add(note)
+            note.unload()
+        self.index_dirty = True
+
+    def dump_notes(self):
+        return [note.to_record() for note in list(self.notes.values())]
+
+    def records(self, notes):
+        records = [note.to_record() for note in notes]
+        for note in notes:
+            note.unload()
+        return records
 
     def save_notes(self):
-        data = [note.__dict__ for note in self.notes]
-        save_data(NOTES_FILE, data)
+        self.storage.save(self.dump_notes())
 
     def add_note(self, title, content):
-        note_id = max([note.note_id for note in self.notes], default=0) + 1
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        new_note = Note(note_id, title, content, timestamp)
-        self.notes.append(new_note)
-        self.save_notes()
+        with self.storage.transaction():
+            note_id = allocate_id(self.storage)
+            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            new_note = Note(note_id, title, content, timestamp)
+            self.notes[note_id] = new_note
+            self.search_index.add(new_note)
+            self.index_dirty = True
+            self.storage.put(new_note.to_record())
         print('Заметка успешно добавлена')
+        return new_note
 
     def list_notes(self):
         if not self.notes:
             print('Список заметок пуст')
             return
-        for note in self.notes:
+        record_scan('NoteManager.list_notes', len(self.notes))
+        for note in self.notes.values():
+            print(f'{note.note_id}. {note.title} (дата: {note.timestamp})')
+
+    def search_notes(self, query, limit=20):
+        results = [self.notes[note_id] for note_id in self.search_index.search(query, limit)]
+        if not results:
+            print('Ничего не найдено')
+            return results
+        print('Результаты поиска:')
+        for note in results:
             print(f'{note.note_id}. {note.title} (дата: {note.timestamp})')
+        return results
 
     def get_note_by_id(self, note_id) -> Note:
-        for note in self.notes:
-            if note.note_id == note_id:
-                return note
-        return None
+        return self.notes.get(note_id)
 
     def view_note(self, note_id):
         note = self.get_note_by_id(note_id)
@@ -78,67 +1713,123 @@ class NoteManager:
             print(f'Заголовок: {note.title}')
             print(f'Содержимое: {note.content}')
             print(f'Дата последнего изменения: {note.timestamp}')
+            note.unload()
         else:
             print('Заметка не найдена')
 
+    def batch(self):
+        return self.storage.batch()
+
+    def update_note(self, note, new_title, new_content):
+        note.title = new_title
+        if new_content is not note.body:
+            note.content = new_content
+        note.timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.search_index.remove(note.note_id)
+        self.search_index.add(note)
+        self.index_dirty = True
+
     def edit_note(self, note_id, new_title, new_content):
         note = self.get_note_by_id(note_id)
         if note:
-            note.title = new_title
-            note.content = new_content
-            note.timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.save_notes()
+            self.update_note(note, new_title, new_content)
+            self.storage.put(note.to_record())
             print('Заметка успешно отредактирована')
+            return note
         else:
             print('Заметка не найдена')
 
     def delete_note(self, note_id):
         note = self.get_note_by_id(note_id)
         if note:
-            self.notes.remove(note)
-            self.save_notes()
+            del self.notes[note_id]
+            self.search_index.remove(note_id)
+            self.index_dirty = True
+            self.storage.delete(note.note_id)
             print('Заметка успешно удалена')
+            return note
         else:
             print('Заметка не найдена')
 
-    def export_notes_to_csv(self):
+    def edit_notes(self, predicate, new_title=None, new_content=None):
+        notes = [note for note in self.notes.values() if predicate(note)]
+        for note in notes:
+            self.update_note(note, new_title or note.title, new_content or note.content)
+        if notes:
+            self.storage.put_many(self.records(notes))
+        print(f'Отредактировано заметок: {len(notes)}')
+        return len(notes)
+
+    def delete_notes(self, note_ids):
+        deleted = []
+        for note_id in note_ids:
+            if self.notes.pop(note_id, None) is not None:
+                self.search_index.remove(note_id)
+                deleted.append(note_id)
+        if deleted:
+            self.index_dirty = True
+            self.storage.delete_many(deleted)
+        print(f'Удалено заметок: {len(deleted)}')
+        return len(deleted)
+
+    def collect_blobs(self):
+        # ссылки собираются под блокировкой, а файлы ещё не записанных чужих заметок защищает NOTE_BLOB_GRACE
+        with self.storage.lock:
+            self.storage.refresh()
+            removed = Note.blobs.collect({note.blob for note in self.notes.values()})
+        print(f'Удалено неиспользуемых файлов: {removed}')
+        return removed
+
+    def note_rows(self, query=None, predicate=None):
+        if query:
+            notes = (self.notes[note_id] for note_id in sorted(self.search_index.search(query, len(self.notes))))
+        else:
+            notes = list(self.notes.values())
+        for note in selected(notes, predicate):
+            yield note.note_id, note.title, note.content, note.timestamp
+            note.unload()
+
+    def export_notes_to_csv(self, file_name='notes.csv', query=None, predicate=None, compress=False, chunk_rows=None):
         if not self.notes:
             print('Список заметок пуст')
             return
-        file_name = 'notes.csv'
-        with open(file_name, 'w', newline='\n\n', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=['ID', 'Заголовок', 'Содержимое', 'Дата'])
-            writer.writeheader()
-            for note in self.notes:
-                writer.writerow({
-                    'ID': note.note_id,
-                    'Заголовок': note.title,
-                    'Содержимое': note.content,
-                    'Дата': note.timestamp
-                })
-        print(f'Заметки успешно экспортированы в файл {file_name}')
-
-    def import_notes_from_csv(self):
-        file_name = input('Введите имя CSV-файла: ')
+        report = export_csv(file_name, ['ID', 'Заголовок', 'Содержимое', 'Дата'], self.note_rows(query, predicate),
+                            compress, chunk_rows)
+        print(f'Заметки успешно экспортированы в файл {report.target()}')
+        report.print_summary()
+        return report
+
+    def note_from_row(self, row):
+        title = row_value(row, 'Заголовок', '')
+        content = row_value(row, 'Содержимое', '')
+        timestamp = row_value(row, 'Дата', datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        return Note(allocate_id(self.storage), title, content, timestamp)
+
+    def commit_notes(self, notes):
+        for note in notes:
+            self.notes[note.note_id] = note
+            self.search_index.add(note)
+        self.index_dirty = True
+        self.storage.put_many(self.records(notes))
+
+    def import_notes_from_csv(self, file_name=None, batch_size=IMPORT_BATCH_SIZE, progress=None, rejected_file=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла: ')
         if not os.path.exists(file_name):
             print(f'Файл {file_name} не найден')
-            return
-        with open(file_name, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                note_id = max([note.note_id for note in self.notes], default=0) + 1
-                title = row.get('Заголовок', '')
-                content = row.get('Содержимое', '')
-                timestamp = row.get('Дата', datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                new_note = Note(note_id, title, content, timestamp)
-                self.notes.append(new_note)
-            self.save_notes()
+            return None
+        with self.storage.transaction():
+            report = import_csv(file_name, self.note_from_row, self.commit_notes, batch_size, progress, rejected_file)
+        self.save_search_index()
         print(f'Заметки успешно импортированы из файла {file_name}')
+        report.print_summary()
+        return report
 
 
 def notes_menu():
-    manager = NoteManager()
+    manager = get_manager(NoteManager)
     while True:
+        manager.storage.refresh()
         print('Управление заметками:')
         print('1. Добавить новую заметку')
         print('2. Просмотреть список заметок')
@@ -147,9 +1838,10 @@ def notes_menu():
         print('5. Удалить заметку')
         print('6. Экспорт заметок в CSV')
         print('7. Импорт заметок из CSV')
-        print('8. Назад')
+        print('8. Поиск заметок')
+        print('9. Назад')
 
-        choise = int(input('Введите номер действия: '))
+        choise = read_choice('Введите номер действия: ')
 
         if choise == 1:
             title = input('Введите заголовок заметки: ')
@@ -182,12 +1874,22 @@ def notes_menu():
         elif choise == 7:
             manager.import_notes_from_csv()
         elif choise == 8:
+            query = input('Введите слова для поиска: ')
+            manager.search_notes(query)
+        elif choise == 9:
             break
         else:
             print('Неверный номер действия, попробуйте снова')
 
 
+TASK_PRIORITIES = ['Низкий', 'Средний', 'Высокий']
+TASK_PRIORITY_RANK = {priority: rank for rank, priority in enumerate(reversed(TASK_PRIORITIES))}  # Высокий — 0
+NO_DUE_DATE = datetime.date.max.toordinal() + 1  # задачи без срока идут после всех задач со сроком
+
+
 class Task:
+    __slots__ = ('task_id', 'title', 'description', 'done', 'priority', 'due_date', 'due_ordinal')
+
     def __init__(self, task_id, title, description, done=False, priority="Средний", due_date=None):
         self.task_id = task_id
         self.title = title
@@ -195,126 +1897,266 @@ class Task:
         self.done = done
         self.priority = priority
         self.due_date = due_date
+        self.due_ordinal = date_ordinal(due_date)
+
+    def schedule_key(self):
+        # порядок планировщика: сначала невыполненные, затем по сроку и по приоритету
+        due = NO_DUE_DATE if self.due_ordinal is None else self.due_ordinal
+        return bool(self.done), due, TASK_PRIORITY_RANK.get(self.priority, len(TASK_PRIORITIES)), self.task_id
+
+    def to_dict(self):
+        return {
+            'task_id': self.task_id,
+            'title': self.title,
+            'description': self.description,
+            'done': self.done,
+            'priority': self.priority,
+            'due_date': self.due_date,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
 
 
 class TaskManager:
     def __init__(self):
-        self.tasks = []
+        self.tasks = {}
+        self.version = 0
+        self.results = ResultCache()
+        self.storage = create_storage(TASKS_FILE, 'task_id', self.dump_tasks)
+        self.storage.on_change = self.apply_changes
         self.load_tasks()
 
     def load_tasks(self):
-        data = load_data(TASKS_FILE, [])
-        self.tasks = [Task(**task) for task in data]
+        data = self.storage.load()
+        self.tasks = {}
+        for item in data:
+            task = Task.from_dict(item)
+            self.tasks[task.task_id] = task
+        restore_next_id(self.storage, self.tasks)
+        self.schedule = SortedIndex(task.schedule_key() for task in self.tasks.values())
+        self.version += 1
+
+    def index_task(self, task):
+        self.schedule.add(task.schedule_key())
+        self.version += 1
+
+    def unindex_task(self, task):
+        self.schedule.remove(task.schedule_key())
+        self.version += 1
+
+    def apply_changes(self, items, deleted):
+        # изменения, записанные другими процессами
+        for task_id in deleted:
+            task = self.tasks.pop(task_id, None)
+            if task is not None:
+                self.unindex_task(task)
+        for item in items:
+            task = Task.from_dict(item)
+            old = self.tasks.get(task.task_id)
+            if old is not None:
+                self.unindex_task(old)
+            self.tasks[task.task_id] = task
+            self.index_task(task)
+
+    def dump_tasks(self):
+        return [task.to_dict() for task in list(self.tasks.values())]
 
     def save_tasks(self):
-        data = [task.__dict__ for task in self.tasks]
-        save_data(TASKS_FILE, data)
+        self.storage.save(self.dump_tasks())
 
     def add_task(self, title, description, priority="Средний", due_date=None):
-        valid_priorities = ['Низкий', 'Средний', 'Высокий']
-        if priority not in valid_priorities:
+        if priority not in TASK_PRIORITIES:
             print("Ошибка: Некорректное значение приоритета. Выберите из: Низкий, Средний, Высокий.")
             return
-        try:
-            datetime.datetime.strptime(due_date, '%d-%m-%Y')  # Проверка формата ДД-ММ-ГГГГ
-        except ValueError:
-            print("Ошибка: Некорректный формат даты. Укажите дату в формате ДД-ММ-ГГГГ.")
-            return
-        task_id = max([task.task_id for task in self.tasks], default=0) + 1
-        new_task = Task(task_id, title, description, done=False, priority=priority, due_date=due_date)
-        self.tasks.append(new_task)
-        self.save_tasks()
+        if due_date is not None:
+            try:
+                datetime.datetime.strptime(due_date, '%d-%m-%Y')  # Проверка формата ДД-ММ-ГГГГ
+            except ValueError:
+                print("Ошибка: Некорректный формат даты. Укажите дату в формате ДД-ММ-ГГГГ.")
+                return
+        with self.storage.transaction():
+            task_id = allocate_id(self.storage)
+            new_task = Task(task_id, title, description, done=False, priority=priority, due_date=due_date)
+            self.tasks[task_id] = new_task
+            self.index_task(new_task)
+            self.storage.put(new_task.to_dict())
         print('Задача успешно добавлена')
+        return new_task
 
     def list_tasks(self):
         if not self.tasks:
             print("Список задач пуст.")
             return
-        for task in self.tasks:
+        record_scan('TaskManager.list_tasks', len(self.tasks))
+        self.show_tasks(self.tasks.values())
+
+    def show_tasks(self, tasks):
+        for task in tasks:
             status = "Выполнена" if task.done else "Не выполнена"
             due_date = task.due_date if task.due_date else "Не указано"
             print(
                 f"ID: {task.task_id}, Заголовок: {task.title}, Статус: {status}, Приоритет: {task.priority}, Срок: {due_date}")
             print(f"Описание: {task.description}")
 
+    def batch(self):
+        return self.storage.batch()
+
+    def update_task(self, task, new_title=None, new_description=None, new_priority=None, new_due_date=None,
+                    done=None):
+        self.unindex_task(task)
+        task.title = new_title or task.title
+        task.description = new_description or task.description
+        task.priority = new_priority or task.priority
+        task.due_date = new_due_date or task.due_date
+        task.due_ordinal = date_ordinal(task.due_date)
+        if done is not None:
+            task.done = done
+        self.index_task(task)
+
     def mark_task_done(self, task_id):
         task = self.get_task_by_id(task_id)
         if task:
-            task.done = True
-            self.save_tasks()
+            self.update_task(task, done=True)
+            self.storage.put(task.to_dict())
             print('Задача успешно выполнена')
+            return task
         else:
             print('Задача не найдена')
 
     def get_task_by_id(self, task_id):
-        for task in self.tasks:
-            if task.task_id == task_id:
-                return task
-        return None
+        return self.tasks.get(task_id)
 
     def edit_task(self, task_id, new_title=None, new_description=None, new_priority=None, new_due_date=None):
         task = self.get_task_by_id(task_id)
         if task:
-            task.title = new_title or task.title
-            task.description = new_description or task.description
-            task.priority = new_priority or task.priority
-            task.due_date = new_due_date or task.due_date
-            self.save_tasks()
+            self.update_task(task, new_title, new_description, new_priority, new_due_date)
+            self.storage.put(task.to_dict())
             print('Задача успешно отредактирована')
+            return task
         else:
             print('Задача не найдена')
 
     def delete_task(self, task_id):
         task = self.get_task_by_id(task_id)
         if task:
-            self.tasks.remove(task)
-            self.save_tasks()
+            del self.tasks[task_id]
+            self.unindex_task(task)
+            self.storage.delete(task.task_id)
             print('Задача успешно удалена')
+            return task
         else:
             print('Задача не найдена')
 
-    def export_tasks_to_csv(self):
+    def mark_tasks_done(self, task_ids):
+        tasks = [self.tasks[task_id] for task_id in task_ids if task_id in self.tasks]
+        for task in tasks:
+            self.update_task(task, done=True)
+        if tasks:
+            self.storage.put_many([task.to_dict() for task in tasks])
+        print(f'Выполнено задач: {len(tasks)}')
+        return len(tasks)
+
+    def edit_tasks(self, predicate, new_title=None, new_description=None, new_priority=None, new_due_date=None):
+        tasks = [task for task in self.tasks.values() if predicate(task)]
+        for task in tasks:
+            self.update_task(task, new_title, new_description, new_priority, new_due_date)
+        if tasks:
+            self.storage.put_many([task.to_dict() for task in tasks])
+        print(f'Отредактировано задач: {len(tasks)}')
+        return len(tasks)
+
+    def delete_tasks(self, task_ids):
+        deleted = []
+        for task_id in task_ids:
+            task = self.tasks.pop(task_id, None)
+            if task is not None:
+                self.unindex_task(task)
+                deleted.append(task_id)
+        if deleted:
+            self.storage.delete_many(deleted)
+        print(f'Удалено задач: {len(deleted)}')
+        return len(deleted)
+
+    @cached_result
+    def scheduled(self, low, high, limit=None):
+        start, end = self.schedule.bounds(low, high)
+        if limit is not None:
+            end = min(end, start + limit)
+        record_scan('TaskManager.scheduled', end - start)
+        return [self.tasks[key[-1]] for key in self.schedule.keys[start:end]]
+
+    def next_tasks(self, n=10):
+        return self.scheduled((False,), (True,), n)
+
+    def overdue_tasks(self, today=None):
+        today = checked_ordinal(today) if today else datetime.date.today().toordinal()
+        return self.scheduled((False,), (False, today))
+
+    def due_between(self, start_date, end_date):
+        # только невыполненные задачи со сроком в интервале, границы включаются
+        return self.scheduled((False, checked_ordinal(start_date)), (False, checked_ordinal(end_date) + 1))
+
+    def task_rows(self, start_date=None, end_date=None, predicate=None):
+        if start_date or end_date:
+            # отбор по сроку идёт по индексу расписания, отдельно для открытых и выполненных задач
+            low = checked_ordinal(start_date) if start_date else 0
+            high = checked_ordinal(end_date) + 1 if end_date else NO_DUE_DATE
+            tasks = self.scheduled((False, low), (False, high)) + self.scheduled((True, low), (True, high))
+            tasks.sort(key=lambda task: task.task_id)
+        else:
+            tasks = list(self.tasks.values())
+        for task in selected(tasks, predicate):
+            status = 'Выполненo' if task.done else 'Не выполненo'
+            yield task.task_id, task.title, task.description, status, task.priority, task.due_date
+
+    def export_tasks_to_csv(self, file_name='tasks.csv', start_date=None, end_date=None, predicate=None, compress=False,
+                            chunk_rows=None):
         if not self.tasks:
             print('Список задач пуст')
             return
-        file_name = 'tasks.csv'
-        with open(file_name, 'w', newline='\n', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=['ID', 'Заголовок', 'Описание', 'Статус', 'Приоритет', 'Срок'])
-            writer.writeheader()
-            for task in self.tasks:
-                writer.writerow({
-                    'ID': task.task_id,
-                    'Заголовок': task.title,
-                    'Описание': task.description,
-                    'Статус': 'Выполненo' if task.done else 'Не выполненo',
-                    'Приоритет': task.priority,
-                    'Срок': task.due_date
-                })
-        print(f'Задачи успешно экспортированы в файл {file_name}')
-
-    def import_tasks_from_csv(self):
-        file_name = input('Введите имя CSV-файла: ')
+        report = export_csv(file_name, ['ID', 'Заголовок', 'Описание', 'Статус', 'Приоритет', 'Срок'],
+                            self.task_rows(start_date, end_date, predicate), compress, chunk_rows)
+        print(f'Задачи успешно экспортированы в файл {report.target()}')
+        report.print_summary()
+        return report
+
+    def task_from_row(self, row):
+        title = row_value(row, 'Заголовок', '')
+        description = row_value(row, 'Описание', '')
+        done = row_value(row, 'Статус', 'Не выполненo') == 'Выполненo'
+        priority = row_value(row, 'Приоритет', '') or 'Средний'
+        due_date = row_value(row, 'Срок', '') or None
+        if priority not in TASK_PRIORITIES:
+            raise ValueError(f'некорректный приоритет {priority}')
+        if due_date and not is_valid_date(due_date):
+            raise ValueError(f'некорректный срок {due_date}')
+        return Task(allocate_id(self.storage), title, description, done, priority, due_date)
+
+    def commit_tasks(self, tasks):
+        for task in tasks:
+            self.tasks[task.task_id] = task
+            self.index_task(task)
+        self.storage.put_many([task.to_dict() for task in tasks])
+
+    def import_tasks_from_csv(self, file_name=None, batch_size=IMPORT_BATCH_SIZE, progress=None, rejected_file=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла: ')
         if not os.path.exists(file_name):
             print(f'Файл {file_name} не найден')
-            return
-        with open(file_name, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                task_id = max([task.task_id for task in self.tasks], default=0) + 1
-                title = row.get('Заголовок', '')
-                description = row.get('Описание', '')
-                done = row.get('Статус', 'Не выполненo') == 'Выполненo'
-                priority = row.get('Приоритет', 'Средний')
-                due_date = row.get('Срок', None)
-                new_task = Task(task_id, title, description, done, priority, due_date)
-                self.tasks.append(new_task)
-            self.save_tasks()
+            return None
+        with self.storage.transaction():
+            report = import_csv(file_name, self.task_from_row, self.commit_tasks, batch_size, progress, rejected_file)
         print(f'Задачи успешно импортированы из файла {file_name}')
+        report.print_summary()
+        return report
 
 
 def tasks_menu():
-    manager = TaskManager()
+    manager = get_manager(TaskManager)
     while True:
+        manager.storage.refresh()
         print('Управление задачами:')
         print('1. Добавить новую задачу')
         print('2. Просмотреть список задач')
@@ -323,9 +2165,12 @@ def tasks_menu():
         print('5. Удалить задачу')
         print('6. Экспортировать задачи в CSV')
         print('7. Импортировать задачи из CSV')
-        print('8. Назад')
+        print('8. Ближайшие задачи')
+        print('9. Просроченные задачи')
+        print('10. Задачи со сроком в интервале')
+        print('11. Назад')
 
-        choise = int(input('Введите номер действия: '))
+        choise = read_choice('Введите номер действия: ')
 
         if choise == 1:
             title = input('Введите заголовок задачи: ')
@@ -362,120 +2207,340 @@ def tasks_menu():
         elif choise == 7:
             manager.import_tasks_from_csv()
         elif choise == 8:
+            try:
+                count = int(input('Сколько задач показать: ') or 10)
+                manager.show_tasks(manager.next_tasks(count))
+            except ValueError:
+                print('Некорректное число')
+        elif choise == 9:
+            tasks = manager.overdue_tasks()
+            if tasks:
+                manager.show_tasks(tasks)
+            else:
+                print('Просроченных задач нет')
+        elif choise == 10:
+            start_date = input('Введите начальную дату в формате ДД-ММ-ГГГГ: ')
+            end_date = input('Введите конечную дату в формате ДД-ММ-ГГГГ: ')
+            if is_valid_date(start_date) and is_valid_date(end_date):
+                manager.show_tasks(manager.due_between(start_date, end_date))
+            else:
+                print('Некорректный формат даты')
+        elif choise == 11:
             break
         else:
             print('Неверный номер действия, попробуйте снова')
 
 
 class Contact:
+    __slots__ = ('contact_id', 'name', 'phone', 'email')
+
     def __init__(self, contact_id, name, phone, email):
         self.contact_id = contact_id
         self.name = name
         self.phone = phone
         self.email = email
 
+    def to_dict(self):
+        return {
+            'contact_id': self.contact_id,
+            'name': self.name,
+            'phone': self.phone,
+            'email': self.email,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+SEARCH_RESULTS_LIMIT = 50
+
+
+def normalize_phone(phone):
+    return ''.join(char for char in phone if char.isdigit())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SubstringIndex:
+    # Поиск подстроки: триграммы сужают кандидатов, отсортированный список значений отдаёт совпадения по префиксу
+    def __init__(self, normalize):
+        self.normalize = normalize
+        self.values = {}
+        self.grams = None  # строятся при первом поиске не с начала строки: загрузке хватает сортировки
+        self.sorted_values = SortedIndex()
+
+    def add(self, key, text):
+        value = self.normalize(text)
+        if not value:
+            return
+        self.values[key] = value
+        self.sorted_values.add((value, key))
+        if self.grams is not None:
+            self.add_grams([(key, value)])
+
+    def add_many(self, items):
+        # загрузка и импорт: значения сортируются один раз вместо вставки по одному
+        pairs = []
+        for key, text in items:
+            value = self.normalize(text)
+            if value:
+                self.values[key] = value
+                pairs.append((value, key))
+        self.sorted_values = SortedIndex(self.sorted_values.keys + pairs)
+        if self.grams is not None:
+            self.add_grams((key, value) for value, key in pairs)
+
+    def add_grams(self, items):
+        # ключи сначала копятся в списках и переходят в множества целиком;
+        # границы строки добавляют триграммы, покрывающие каждый символ даже в коротких значениях
+        postings = collections.defaultdict(list)
+        for key, value in items:
+            for gram in trigrams(f'\x02{value}\x03'):
+                postings[gram].append(key)
+        for gram, keys in postings.items():
+            self.grams.setdefault(gram, set()).update(keys)
+
+    def remove(self, key):
+        value = self.values.pop(key, None)
+        if value is None:
+            return
+        self.sorted_values.remove((value, key))
+        if self.grams is None:
+            return
+        for gram in trigrams(f'\x02{value}\x03'):
+            keys = self.grams[gram]
+            keys.discard(key)
+            if not keys:
+                del self.grams[gram]
+
+    def candidates(self, query, limit):
+        if self.grams is None:
+            self.grams = {}
+            self.add_grams(self.values.items())
+        if len(query) >= 3:
+            groups = sorted((self.grams.get(gram, set()) for gram in trigrams(query)), key=len)
+            return set.intersection(*groups) if groups[0] else set()
+        # запрос короче триграммы встречается почти везде: хватает первых limit найденных значений
+        found = set()
+        for gram, keys in self.grams.items():
+            if query in gram:
+                for key in keys:
+                    found.add(key)
+                    if len(found) >= limit:
+                        return found
+        return found
+
+    def search(self, query, limit=SEARCH_RESULTS_LIMIT):
+        query = self.normalize(query)
+        if not query:
+            return []
+        # сначала точные совпадения и совпадения с начала строки — они идут первыми в сортированном списке
+        start, end = self.sorted_values.bounds((query,), (query + '\U0010ffff',))
+        results = [key for _, key in self.sorted_values.keys[start:min(end, start + limit)]]
+        scanned = len(results)
+        if len(results) < limit:
+            seen = set(results)
+            candidates = self.candidates(query, limit + len(seen))
+            scanned += len(candidates)
+            matches = ((self.values[key].find(query), self.values[key], key)
+                       for key in candidates if key not in seen)
+            matches = (match for match in matches if match[0] > 0)
+            results.extend(key for _, _, key in heapq.nsmallest(limit - len(results), matches))
+        record_scan('SubstringIndex.search', scanned)
+        return results
+
 
 class ContactManager:
     def __init__(self):
-        self.contacts = []
+        self.contacts = {}
+        self.storage = create_storage(CONTACTS_FILE, 'contact_id', self.dump_contacts)
+        self.storage.on_change = self.apply_changes
         self.load_contacts()
 
+    def index_contact(self, contact):
+        self.name_index.add(contact.contact_id, contact.name)
+        self.phone_index.add(contact.contact_id, contact.phone)
+
+    def index_contacts(self, contacts):
+        self.name_index.add_many((contact.contact_id, contact.name) for contact in contacts)
+        self.phone_index.add_many((contact.contact_id, contact.phone) for contact in contacts)
+
+    def unindex_contact(self, contact):
+        self.name_index.remove(contact.contact_id)
+        self.phone_index.remove(contact.contact_id)
+
     def load_contacts(self):
-        data = load_data(CONTACTS_FILE, [])
-        self.contacts = [Contact(**contact) for contact in data]
+        data = self.storage.load()
+        self.contacts = {}
+        for item in data:
+            contact = Contact.from_dict(item)
+            self.contacts[contact.contact_id] = contact
+        restore_next_id(self.storage, self.contacts)
+        self.name_index = SubstringIndex(fold_text)
+        self.phone_index = SubstringIndex(normalize_phone)
+        self.index_contacts(list(self.contacts.values()))
+
+    def apply_changes(self, items, deleted):
+        # изменения, записанные другими процессами
+        for contact_id in deleted:
+            contact = self.contacts.pop(contact_id, None)
+            if contact is not None:
+                self.unindex_contact(contact)
+        contacts = [Contact.from_dict(item) for item in items]
+        for contact in contacts:
+            old = self.contacts.get(contact.contact_id)
+            if old is not None:
+                self.unindex_contact(old)
+            self.contacts[contact.contact_id] = contact
+        self.index_contacts(contacts)
+
+    def dump_contacts(self):
+        return [contact.to_dict() for contact in list(self.contacts.values())]
 
     def save_contacts(self):
-        data = [contact.__dict__ for contact in self.contacts]
-        save_data(CONTACTS_FILE, data)
+        self.storage.save(self.dump_contacts())
 
     def add_contact(self, name, phone, email):
-        contact_id = max([contact.contact_id for contact in self.contacts], default=0) + 1
-        new_contact = Contact(contact_id, name, phone, email)
-        self.contacts.append(new_contact)
-        self.save_contacts()
+        with self.storage.transaction():
+            contact_id = allocate_id(self.storage)
+            new_contact = Contact(contact_id, name, phone, email)
+            self.contacts[contact_id] = new_contact
+            self.index_contact(new_contact)
+            self.storage.put(new_contact.to_dict())
         print('Контакт успешно добавлен')
-
-    def search_contacts(self, query):
-        results = [
-            contact for contact in self.contacts
-            if query.lower() in contact.name.lower() or query in contact.phone
-        ]
+        return new_contact
+
+    def find_contacts(self, query, limit=SEARCH_RESULTS_LIMIT):
+        found = self.name_index.search(query, limit)
+        if len(found) < limit and normalize_phone(query):
+            for contact_id in self.phone_index.search(query, limit):
+                if contact_id not in found:
+                    found.append(contact_id)
+        return [self.contacts[contact_id] for contact_id in found[:limit]]
+
+    def search_contacts(self, query, limit=SEARCH_RESULTS_LIMIT):
+        results = self.find_contacts(query, limit)
         if results:
             print('Результаты поиска:')
             for contact in results:
                 print(
                     f'ID: {contact.contact_id}, Имя: {contact.name}, Телефон: {contact.phone}, Электронная почта: {contact.email}')
+            if len(results) == limit:
+                print(f'Показано результатов: {limit}, для остальных уточните запрос')
         else:
             print('Ничего не найдено')
 
+    def batch(self):
+        return self.storage.batch()
+
+    def update_contact(self, contact, new_name, new_phone, new_email):
+        self.unindex_contact(contact)
+        contact.name = new_name
+        contact.phone = new_phone
+        contact.email = new_email
+        self.index_contact(contact)
+
     def edit_contact(self, contact_id, new_name, new_phone, new_email):
         contact = self.get_contact_by_id(contact_id)
         if contact:
-            contact.name = new_name
-            contact.phone = new_phone
-            contact.email = new_email
-            self.save_contacts()
+            self.update_contact(contact, new_name, new_phone, new_email)
+            self.storage.put(contact.to_dict())
             print('Контакт успешно отредактирован')
+            return contact
         else:
             print('Контакт не найден')
 
     def delete_contact(self, contact_id):
         contact = self.get_contact_by_id(contact_id)
         if contact:
-            self.contacts.remove(contact)
-            self.save_contacts()
+            del self.contacts[contact_id]
+            self.unindex_contact(contact)
+            self.storage.delete(contact.contact_id)
             print('Контакт успешно удален')
+            return contact
         else:
             print('Контакт не найден')
 
+    def edit_contacts(self, predicate, new_name=None, new_phone=None, new_email=None):
+        contacts = [contact for contact in self.contacts.values() if predicate(contact)]
+        for contact in contacts:
+            self.update_contact(contact, new_name or contact.name, new_phone or contact.phone,
+                                new_email or contact.email)
+        if contacts:
+            self.storage.put_many([contact.to_dict() for contact in contacts])
+        print(f'Отредактировано контактов: {len(contacts)}')
+        return len(contacts)
+
+    def delete_contacts(self, contact_ids):
+        deleted = []
+        for contact_id in contact_ids:
+            contact = self.contacts.pop(contact_id, None)
+            if contact is not None:
+                self.unindex_contact(contact)
+                deleted.append(contact_id)
+        if deleted:
+            self.storage.delete_many(deleted)
+        print(f'Удалено контактов: {len(deleted)}')
+        return len(deleted)
+
     def get_contact_by_id(self, contact_id):
-        for contact in self.contacts:
-            if contact.contact_id == contact_id:
-                return contact
-        return None
+        return self.contacts.get(contact_id)
 
-    def export_contacts_to_csv(self):
+    def contact_rows(self, query=None, predicate=None):
+        contacts = self.find_contacts(query, len(self.contacts)) if query else list(self.contacts.values())
+        for contact in selected(contacts, predicate):
+            yield contact.contact_id, contact.name, contact.phone, contact.email
+
+    def export_contacts_to_csv(self, file_name='contacts.csv', query=None, predicate=None, compress=False,
+                               chunk_rows=None):
         if not self.contacts:
-            print('Контакты не найдены')
+            print('Контакты не найдены')
             return
-
-        file_name = 'contacts.csv'
-
-        with open(file_name, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=['ID', 'Имя', 'Телефон', 'Электронная почта'])
-            writer.writeheader()
-            for contact in self.contacts:
-                writer.writerow({
-                    'ID': contact.contact_id,
-                    'Имя': contact.name,
-                    'Телефон': contact.phone,
-                    'Электронная почта': contact.email
-                })
-
-        print(f'Контакты успешно экспортированы в файл {CONTACTS_FILE}')
-
-    def import_contacts_from_csv(self):
-        file_name = input('Введите имя CSV-файла: ')
+        report = export_csv(file_name, ['ID', 'Имя', 'Телефон', 'Электронная почта'],
+                            self.contact_rows(query, predicate), compress, chunk_rows)
+        print(f'Контакты успешно экспортированы в файл {report.target()}')
+        report.print_summary()
+        return report
+
+    def contact_from_row(self, row):
+        contact_id = int(row_value(row, 'ID'))
+        name = row_value(row, 'Имя')
+        phone = row_value(row, 'Телефон')
+        email = row_value(row, 'Электронная почта')
+        return Contact(contact_id, name, phone, email)
+
+    def commit_contacts(self, contacts):
+        for contact in contacts:
+            if contact.contact_id in self.contacts:
+                contact.contact_id = allocate_id(self.storage)
+            else:
+                restore_next_id(self.storage, [contact.contact_id])
+            self.contacts[contact.contact_id] = contact
+        self.index_contacts(contacts)
+        self.storage.put_many([contact.to_dict() for contact in contacts])
+
+    def import_contacts_from_csv(self, file_name=None, batch_size=IMPORT_BATCH_SIZE, progress=None, rejected_file=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла: ')
         if not os.path.exists(file_name):
             print(f'Файл {file_name} не найден')
-            return
-        with open(file_name, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                contact_id = int(row['ID'])
-                name = row['Имя']
-                phone = row['Телефон']
-                email = row['Электронная почта']
-                new_contact = Contact(contact_id, name, phone, email)
-                self.contacts.append(new_contact)
-            self.save_contacts()
+            return None
+        with self.storage.transaction():
+            report = import_csv(file_name, self.contact_from_row, self.commit_contacts, batch_size, progress,
+                                rejected_file)
         print(f'Контакты успешно импортированы из файла {file_name}')
+        report.print_summary()
+        return report
 
 
 def contacts_menu():
-    manager = ContactManager()
+    manager = get_manager(ContactManager)
 
     while True:
+        manager.storage.refresh()
         print('Управление контактами:')
         print('1. Добавить новый контакт')
         print('2. Найти контакт')
@@ -485,7 +2550,7 @@ def contacts_menu():
         print('6. Импортировать контакты из CSV')
         print('7. Назад')
 
-        choise = int(input('Введите номер действия: '))
+        choise = read_choice('Введите номер действия: ')
 
         if choise == 1:
             name = input('Введите имя контакта: ')
@@ -521,41 +2586,393 @@ def contacts_menu():
 
 
 class FinanceRecord:
+    __slots__ = ('record_id', 'description', 'amount', 'category', 'date', 'ordinal')
+
     def __init__(self, record_id, description, amount, category, date):
         self.record_id = record_id
         self.description = description
         self.amount = amount
         self.category = category
         self.date = date
+        self.ordinal = date_ordinal(date)
+
+    def to_dict(self):
+        return {
+            'record_id': self.record_id,
+            'description': self.description,
+            'amount': self.amount,
+            'category': self.category,
+            'date': self.date,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def add_to_bucket(buckets, key, values):
+    bucket = buckets.setdefault(key, [0] * len(values))
+    for i, value in enumerate(values):
+        bucket[i] += value
+    if not bucket[-1]:
+        del buckets[key]  # в корзине не осталось записей
+
+
+class SortedIndex:
+    def __init__(self, keys=()):
+        self.keys = sorted(keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key):
+        bisect.insort(self.keys, key)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def bounds(self, low, high):
+        # ключи — кортежи, поэтому (x,) меньше любого ключа, начинающегося с x
+        return bisect.bisect_left(self.keys, low), bisect.bisect_left(self.keys, high)
+
+    def range(self, low, high):
+        start, end = self.bounds(low, high)
+        return self.keys[start:end]
+
+
+class FinanceTotals:
+    # Агрегаты хранятся прямо в метаданных хранилища, поэтому сохраняются вместе с данными без пересчёта
+    def __init__(self, data):
+        self.data = data
+        data.setdefault('income', 0)
+        data.setdefault('expense', 0)
+        data.setdefault('count', 0)
+        data.setdefault('categories', {})  # категория -> [сумма, число записей]
+        data.setdefault('days', {})  # ГГГГММДД -> [доход, расход, число записей]
+        data.setdefault('months', {})  # ГГГГММ -> [доход, расход, число записей]
+
+    def add(self, record, sign=1):
+        amount = record.amount * sign
+        income = amount if record.amount > 0 else 0
+        expense = amount if record.amount < 0 else 0
+        self.data['income'] += income
+        self.data['expense'] += expense
+        self.data['count'] += sign
+        add_to_bucket(self.data['categories'], record.category, (amount, sign))
+        key = date_key(record.date)
+        if key is not None:
+            add_to_bucket(self.data['days'], str(key), (income, expense, sign))
+            add_to_bucket(self.data['months'], str(key // 100), (income, expense, sign))
+
+    def remove(self, record):
+        self.add(record, -1)
+
+    def balance(self):
+        return self.data['income'] + self.data['expense']
+
+    def categories(self):
+        return {category: total for category, (total, _) in self.data['categories'].items()}
+
+    def prefix_sums(self):
+        days = sorted((int(key), bucket) for key, bucket in self.data['days'].items())
+        keys = [key for key, _ in days]
+        sums = [(0, 0, 0)]
+        for _, (income, expense, count) in days:
+            last_income, last_expense, last_count = sums[-1]
+            sums.append((last_income + income, last_expense + expense, last_count + count))
+        return keys, sums
+
+
+def month_label(month_code):
+    year, month = divmod(month_code, 12)
+    return f'{month + 1:02d}-{year}'
+
+
+class FinanceColumns:
+    # Колоночное представление записей для аналитики: суммы, даты и коды категорий в отдельных массивах
+    def __init__(self, records):
+        load_numpy()
+        self.categories = []
+        category_codes = {}
+        amounts, ordinals, codes, months = array('d'), array('l'), array('l'), array('l')
+        for record in records:
+            code = category_codes.get(record.category)
+            if code is None:
+                code = category_codes[record.category] = len(self.categories)
+                self.categories.append(record.category)
+            amounts.append(record.amount)
+            codes.append(code)
+            if record.ordinal is None:
+                ordinals.append(-1)
+                months.append(-1)
+            else:
+                date = datetime.date.fromordinal(record.ordinal)
+                ordinals.append(record.ordinal)
+                months.append(date.year * 12 + date.month - 1)
+        if np is not None:
+            amounts, ordinals, codes, months = (np.frombuffer(column, dtype=column.typecode)
+                                                for column in (amounts, ordinals, codes, months))
+        self.amounts, self.ordinals, self.codes, self.months = amounts, ordinals, codes, months
+
+    def report(self, start_ordinal, end_ordinal):
+        if np is not None:
+            selected = self.amounts[(self.ordinals >= start_ordinal) & (self.ordinals <= end_ordinal)]
+            return len(selected), selected[selected > 0].sum().item(), selected[selected < 0].sum().item()
+        count = income = expenses = 0
+        for amount, ordinal in zip(self.amounts, self.ordinals):
+            if start_ordinal <= ordinal <= end_ordinal:
+                count += 1
+                if amount > 0:
+                    income += amount
+                else:
+                    expenses += amount
+        return count, income, expenses
+
+    def balance(self):
+        if np is not None:
+            return self.amounts.sum().item()
+        return sum(self.amounts)
+
+    def by_category(self):
+        if np is not None:
+            totals = np.bincount(self.codes, weights=self.amounts, minlength=len(self.categories)).tolist()
+        else:
+            totals = [0] * len(self.categories)
+            for code, amount in zip(self.codes, self.amounts):
+                totals[code] += amount
+        return dict(zip(self.categories, totals))
+
+    def by_month(self):
+        if np is not None:
+            dated = self.months >= 0
+            months, amounts = self.months[dated], self.amounts[dated]
+            result = {}
+            for month in np.unique(months).tolist():
+                selected = amounts[months == month]
+                result[month] = (selected[selected > 0].sum().item(), selected[selected < 0].sum().item())
+            return result
+        result = {}
+        for month, amount in zip(self.months, self.amounts):
+            if month < 0:
+                continue
+            income, expenses = result.get(month, (0, 0))
+            result[month] = (income + amount, expenses) if amount > 0 else (income, expenses + amount)
+        return dict(sorted(result.items()))
+
+    def pivot(self):
+        # таблица категория x месяц с суммами записей
+        if np is not None:
+            dated = self.months >= 0
+            months, codes, amounts = self.months[dated], self.codes[dated], self.amounts[dated]
+            if not len(months):
+                return {}
+            first = months.min()
+            width = months.max() - first + 1
+            cells = codes * width + (months - first)
+            size = len(self.categories) * width
+            totals = np.bincount(cells, weights=amounts, minlength=size).reshape(-1, width)
+            counts = np.bincount(cells, minlength=size).reshape(-1, width)
+            result = {}
+            for code, column in zip(*np.nonzero(counts)):
+                result.setdefault(self.categories[code], {})[int(first + column)] = totals[code, column].item()
+            return result
+        result = {}
+        for code, month, amount in zip(self.codes, self.months, self.amounts):
+            if month < 0:
+                continue
+            row = result.setdefault(self.categories[code], {})
+            row[month] = row.get(month, 0) + amount
+        return {category: dict(sorted(row.items())) for category, row in result.items()}
 
 
 class FinanceManager:
     def __init__(self):
-        self.records = []
-        self.load_records()
+        if FINANCE_PARTITIONS and STORAGE_BACKEND != 'sqlite':
+            # читается только манифест, записи загружаются при первом обращении к ним (см. __getattr__)
+            self.version = 0
+            self.results = ResultCache()
+            self.storage = PartitionedStorage(FINANCE_FILE, 'record_id', self.dump_partition)
+            self.storage.on_change = self.apply_changes
+            self.storage.open()
+        else:
+            self.records = {}
+            self.version = 0
+            self.results = ResultCache()
+            self.storage = create_storage(FINANCE_FILE, 'record_id', self.dump_records)
+            self.storage.on_change = self.apply_changes
+            parts = os.path.splitext(FINANCE_FILE)[0] + '.parts'
+            if STORAGE_BACKEND != 'sqlite' and os.path.isdir(parts) and not os.path.exists(FINANCE_FILE):
+                print(f'Финансовые записи хранятся по месяцам в {parts}: включите PA_FINANCE_PARTITIONS=1')
+            self.load_records()
+
+    def __getattr__(self, name):
+        if name in ('records', 'totals', 'date_index', 'prefix', 'columns'):
+            self.load_records()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def loaded(self):
+        return 'records' in vars(self)
 
     def load_records(self):
-        data = load_data(FINANCE_FILE, [])
-        self.records = [FinanceRecord(**record) for record in data]
+        data = self.storage.load()
+        self.records = {}
+        for item in data:
+            record = FinanceRecord.from_dict(item)
+            self.records[record.record_id] = record
+        restore_next_id(self.storage, self.records)
+        totals = self.storage.meta.get('totals')
+        if self.storage.replayed or self.storage.stale or not totals or totals.get('count') != len(self.records):
+            self.rebuild_totals()
+        else:
+            self.totals = FinanceTotals(totals)
+        self.date_index = SortedIndex(
+            (record.ordinal, record.record_id) for record in self.records.values() if record.ordinal is not None)
+        self.prefix = None
+        self.columns = None
+        self.version += 1
+
+    def rebuild_totals(self):
+        self.storage.meta['totals'] = {}
+        self.totals = FinanceTotals(self.storage.meta['totals'])
+        for record in self.records.values():
+            self.totals.add(record)
+
+    def index_record(self, record):
+        self.totals.add(record)
+        if record.ordinal is not None:
+            self.date_index.add((record.ordinal, record.record_id))
+        self.prefix = None
+        self.columns = None
+        self.version += 1
+
+    def unindex_record(self, record):
+        self.totals.remove(record)
+        if record.ordinal is not None:
+            self.date_index.remove((record.ordinal, record.record_id))
+        self.prefix = None
+        self.columns = None
+        self.version += 1
+
+    def columnar(self):
+        if self.columns is None:
+            self.columns = FinanceColumns(self.records.values())
+        return self.columns
+
+    def apply_changes(self, items, deleted):
+        # изменения, записанные другими процессами
+        for record_id in deleted:
+            record = self.records.pop(record_id, None)
+            if record is not None:
+                self.unindex_record(record)
+        for item in items:
+            record = FinanceRecord.from_dict(item)
+            old = self.records.get(record.record_id)
+            if old is not None:
+                self.unindex_record(old)
+            self.records[record.record_id] = record
+            self.index_record(record)
+
+    def dump_records(self):
+        return [record.to_dict() for record in list(self.records.values())]
+
+    def dump_partition(self, partition):
+        if partition == UNDATED_PARTITION:
+            records = [record for record in self.records.values() if record.ordinal is None]
+        else:
+            start, end = partition_bounds(partition)
+            records = [self.records[record_id] for _, record_id in self.date_index.range((start,), (end,))]
+        return [record.to_dict() for record in records]
 
     def save_records(self):
-        data = [record.__dict__ for record in self.records]
-        save_data(FINANCE_FILE, data)
+        self.storage.save(self.dump_records())
+
+    def batch(self):
+        return self.storage.batch()
 
     def add_record(self, description, amount, category, date):
-        record_id = max([record.record_id for record in self.records], default=0) + 1
-        new_record = FinanceRecord(record_id, description, amount, category, date)
-        self.records.append(new_record)
-        self.save_records()
+        with self.storage.transaction():
+            record_id = allocate_id(self.storage)
+            new_record = FinanceRecord(record_id, description, amount, category, date)
+            self.records[record_id] = new_record
+            self.index_record(new_record)
+            self.storage.put(new_record.to_dict())
         print('Запись успешно добавлена')
+        return new_record
+
+    def get_record_by_id(self, record_id):
+        return self.records.get(record_id)
+
+    def add_records(self, items):
+        # items — словари с полями description, amount, category, date
+        with self.storage.transaction():
+            records = [FinanceRecord(allocate_id(self.storage), item['description'], item['amount'],
+                                     item['category'], item['date']) for item in items]
+            if records:
+                self.commit_records(records)
+        print(f'Добавлено записей: {len(records)}')
+        return records
+
+    def update_record(self, record, new_description=None, new_amount=None, new_category=None, new_date=None):
+        self.unindex_record(record)
+        record.description = new_description or record.description
+        record.amount = record.amount if new_amount is None else new_amount
+        record.category = new_category or record.category
+        record.date = new_date or record.date
+        record.ordinal = date_ordinal(record.date)
+        self.index_record(record)
+
+    def edit_record(self, record_id, new_description=None, new_amount=None, new_category=None, new_date=None):
+        record = self.get_record_by_id(record_id)
+        if record:
+            self.update_record(record, new_description, new_amount, new_category, new_date)
+            self.storage.put(record.to_dict())
+            print('Запись успешно отредактирована')
+            return record
+        else:
+            print('Запись не найдена')
+
+    def delete_record(self, record_id):
+        record = self.get_record_by_id(record_id)
+        if record:
+            del self.records[record_id]
+            self.unindex_record(record)
+            self.storage.delete(record_id)
+            print('Запись успешно удалена')
+            return record
+        else:
+            print('Запись не найдена')
+
+    def edit_records(self, predicate, new_description=None, new_amount=None, new_category=None, new_date=None):
+        records = [record for record in self.records.values() if predicate(record)]
+        for record in records:
+            self.update_record(record, new_description, new_amount, new_category, new_date)
+        if records:
+            self.storage.put_many([record.to_dict() for record in records])
+        print(f'Отредактировано записей: {len(records)}')
+        return len(records)
+
+    def delete_records(self, record_ids):
+        deleted = []
+        for record_id in record_ids:
+            record = self.records.pop(record_id, None)
+            if record is not None:
+                self.unindex_record(record)
+                deleted.append(record_id)
+        if deleted:
+            self.storage.delete_many(deleted)
+        print(f'Удалено записей: {len(deleted)}')
+        return len(deleted)
 
     def view_records(self, filter_date=None, filter_category=None):
-        filtered_records = self.records
-        if filter_date:
-            filtered_records = [record for record in filtered_records if record.date == filter_date]
-        if filter_category:
-            filtered_records = [record for record in filtered_records if
-                                record.category.lower() == filter_category.lower()]
+        if isinstance(self.storage, SqliteStorage):
+            filtered_records = self.query_records(filter_date, filter_category)
+        elif not self.loaded() and (filter_date or filter_category):
+            filtered_records = self.partition_records(filter_date, filter_category)
+        else:
+            filtered_records = self.scan_records(filter_date, filter_category)
         if not filtered_records:
             print('Ничего не найдено')
             return
@@ -563,90 +2980,228 @@ class FinanceManager:
             print(
                 f'ID: {record.record_id}, Описание: {record.description}, Сумма: {record.amount}, Категория: {record.category}, Дата: {record.date}')
 
+    def query_records(self, filter_date=None, filter_category=None):
+        conditions, params = ['1'], []
+        if filter_date:
+            conditions.append('date = ?')
+            params.append(filter_date)
+        if filter_category:
+            conditions.append('category_key = ?')
+            params.append(filter_category.lower())
+        rows = self.storage.select(' AND '.join(conditions), params)
+        return [FinanceRecord.from_dict(row) for row in rows]
+
+    def scan_records(self, filter_date=None, filter_category=None):
+        filtered_records = list(self.records.values())
+        record_scan('FinanceManager.scan_records', len(filtered_records))
+        if filter_date:
+            filtered_records = [record for record in filtered_records if record.date == filter_date]
+        if filter_category:
+            filtered_records = [record for record in filtered_records if
+                                record.category.lower() == filter_category.lower()]
+        return filtered_records
+
+    def partition_records(self, filter_date=None, filter_category=None):
+        # читаются только партиции нужного месяца и те, где по манифесту есть нужная категория
+        partitions = self.storage.partitions()
+        names = [partition_of(filter_date)] if filter_date else list(partitions)
+        if filter_category:
+            category = filter_category.lower()
+            names = [name for name in names if name in partitions and
+                     any(key.lower() == category for key in partitions[name]['categories'])]
+        records = []
+        scanned = 0
+        for name in names:
+            if name not in partitions:
+                continue
+            scanned += partitions[name]['count']
+            for item in self.storage.read_partition(name):
+                record = FinanceRecord.from_dict(item)
+                if filter_date and record.date != filter_date:
+                    continue
+                if filter_category and record.category.lower() != category:
+                    continue
+                records.append(record)
+        record_scan('FinanceManager.partition_records', scanned)
+        records.sort(key=lambda record: record.record_id)
+        return records
+
+    def partition_totals(self, start_ordinal, end_ordinal):
+        # месяцы, целиком попавшие в период, считаются по манифесту, остальные пересекающиеся читаются с диска
+        count = income = expenses = scanned = 0
+        for name, summary in self.storage.partitions().items():
+            if name == UNDATED_PARTITION:
+                continue
+            first, last = partition_bounds(name)
+            if last <= start_ordinal or first > end_ordinal:
+                continue
+            if start_ordinal <= first and last - 1 <= end_ordinal:
+                count += summary['count']
+                income += summary['income']
+                expenses += summary['expense']
+                continue
+            scanned += summary['count']
+            for item in self.storage.read_partition(name):
+                record = FinanceRecord.from_dict(item)
+                if start_ordinal <= record.ordinal <= end_ordinal:
+                    count += 1
+                    if record.amount > 0:
+                        income += record.amount
+                    else:
+                        expenses += record.amount
+        record_scan('FinanceManager.partition_totals', scanned)
+        return count, income, expenses
+
+    @cached_result
+    def report_totals(self, start_date, end_date):
+        if not self.loaded():
+            return self.partition_totals(date_ordinal(start_date), date_ordinal(end_date))
+        if COLUMNAR_ANALYTICS:
+            record_scan('FinanceColumns.report', len(self.records))
+            return self.columnar().report(date_ordinal(start_date), date_ordinal(end_date))
+        return self.period_totals(date_key(start_date), date_key(end_date))
+
     def generate_report(self, start_date, end_date):
         try:
-            start = datetime.datetime.strptime(start_date, "%d-%m-%Y")
-            end = datetime.datetime.strptime(end_date, "%d-%m-%Y")
+            datetime.datetime.strptime(start_date, "%d-%m-%Y")
+            datetime.datetime.strptime(end_date, "%d-%m-%Y")
         except ValueError:
             print("Некорректный формат даты. Используйте ДД-ММ-ГГГГ.")
             return
 
-        filtered_records = [
-            record for record in self.records
-            if start <= datetime.datetime.strptime(record.date, "%d-%m-%Y") <= end
-        ]
-        if not filtered_records:
+        count, income, expenses = self.report_totals(start_date, end_date)
+        if not count:
             print("Нет записей за указанный период.")
             return
 
-        income = sum(record.amount for record in filtered_records if record.amount > 0)
-        expenses = sum(record.amount for record in filtered_records if record.amount < 0)
-
         print(f"Отчёт с {start_date} по {end_date}:")
         print(f"Общий доход: {income}")
         print(f"Общие расходы: {abs(expenses)}")
         print(f"Баланс: {income + expenses}")
 
-    def export_records_to_csv(self):
+    def period_totals(self, start_key, end_key):
+        if self.prefix is None:
+            self.prefix = self.totals.prefix_sums()
+        keys, sums = self.prefix
+        start, end = bisect.bisect_left(keys, start_key), bisect.bisect_right(keys, end_key)
+        if start >= end:
+            return 0, 0, 0  # пустой или перевёрнутый период, как в колоночном и партиционном режимах
+        start_income, start_expense, start_count = sums[start]
+        end_income, end_expense, end_count = sums[end]
+        return end_count - start_count, end_income - start_income, end_expense - start_expense
+
+    def records_between(self, start_date, end_date):
+        keys = self.date_index.range((checked_ordinal(start_date),), (checked_ordinal(end_date) + 1,))
+        return [self.records[record_id] for _, record_id in keys]
+
+    def record_rows(self, start_date=None, end_date=None, category=None, predicate=None):
+        if start_date or end_date:
+            # отбор по датам идёт по индексу дат, без просмотра всех записей
+            low = checked_ordinal(start_date) if start_date else 0
+            high = checked_ordinal(end_date) + 1 if end_date else math.inf
+            records = [self.records[record_id] for _, record_id in self.date_index.range((low,), (high,))]
+        else:
+            records = list(self.records.values())
+        if category:
+            category = category.lower()
+            records = [record for record in records if record.category.lower() == category]
+        for record in selected(records, predicate):
+            yield record.record_id, record.description, record.amount, record.category, record.date
+
+    def export_records_to_csv(self, file_name='records.csv', start_date=None, end_date=None, category=None,
+                              predicate=None, compress=False, chunk_rows=None):
         if not self.records:
-            print('Записи не найдены')
+            print('Записи не найдены')
             return
-
-        file_name = 'records.csv'
-        with open(file_name, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=['ID', 'Описание', 'Сумма', 'Категория', 'Дата'])
-            writer.writeheader()
-            for record in self.records:
-                writer.writerow({
-                    'ID': record.record_id,
-                    'Описание': record.description,
-                    'Сумма': record.amount,
-                    'Категория': record.category,
-                    'Дата': record.date
-                })
-
-        print(f'Записи успешно экспортированы в файл {file_name}')
-
-    def import_records_from_csv(self):
-        file_name = input('Введите имя CSV-файла: ')
-
+        report = export_csv(file_name, ['ID', 'Описание', 'Сумма', 'Категория', 'Дата'],
+                            self.record_rows(start_date, end_date, category, predicate), compress, chunk_rows)
+        print(f'Записи успешно экспортированы в файл {report.target()}')
+        report.print_summary()
+        return report
+
+    def record_from_row(self, row):
+        description = row_value(row, 'Описание', '')
+        amount = row_value(row, 'Сумма', '0')
+        try:
+            amount = float(amount)
+        except ValueError:
+            raise ValueError(f'некорректная сумма {amount}')
+        category = row_value(row, 'Категория', '')
+        date = row_value(row, 'Дата', '')
+        if not is_valid_date(date):
+            raise ValueError(f'некорректная дата {date}')
+        return FinanceRecord(allocate_id(self.storage), description, amount, category, date)
+
+    def commit_records(self, records):
+        for record in records:
+            self.records[record.record_id] = record
+            self.index_record(record)
+        self.storage.put_many([record.to_dict() for record in records])
+
+    def import_records_from_csv(self, file_name=None, batch_size=IMPORT_BATCH_SIZE, progress=None, rejected_file=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла: ')
         if not os.path.exists(file_name):
             print(f'Файл {file_name} не найден')
-            return
-
-        with open(file_name, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                record_id = max([record.record_id for record in self.records], default=0) + 1
-                description = row.get('Описание', '')
-                amount = float(row.get('Сумма', 0))
-                category = row.get('Категория', '')
-                date = row.get('Дата', '')
-                new_record = FinanceRecord(record_id, description, amount, category, date)
-                self.records.append(new_record)
-            self.save_records()
-
-        print(f'Записи успешно импортированы из файла {FINANCE_FILE}')
+            return None
+        with self.storage.transaction():
+            report = import_csv(file_name, self.record_from_row, self.commit_records, batch_size, progress,
+                                rejected_file)
+        print(f'Записи успешно импортированы из файла {file_name}')
+        report.print_summary()
+        return report
+
+    @cached_result
+    def balance(self):
+        if not self.loaded():
+            partitions = self.storage.partitions().values()
+            return sum(summary['income'] + summary['expense'] for summary in partitions)
+        return self.columnar().balance() if COLUMNAR_ANALYTICS else self.totals.balance()
+
+    @cached_result
+    def category_totals(self):
+        if not self.loaded():
+            categories = {}
+            for summary in self.storage.partitions().values():
+                for category, (total, _) in summary['categories'].items():
+                    categories[category] = categories.get(category, 0) + total
+            return categories
+        return self.columnar().by_category() if COLUMNAR_ANALYTICS else self.totals.categories()
 
     def calculate_balance(self):
-        income = sum(record.amount for record in self.records if record.amount > 0)
-        expense = sum(record.amount for record in self.records if record.amount < 0)
-        print(f'Итоговый баланс: {income + expense}')
+        print(f'Итоговый баланс: {self.balance()}')
 
     def group_by_category(self):
-        categories = {}
-        for record in self.records:
-            categories.setdefault(record.category, 0)
-            categories[record.category] += record.amount
+        categories = self.category_totals()
         print('Суммы по категориям:')
         for category, total in categories.items():
             print(f'{category}: {total}')
 
+    def group_by_month(self):
+        months = self.columnar().by_month()
+        if not months:
+            print('Ничего не найдено')
+            return
+        print('Доходы и расходы по месяцам:')
+        for month, (income, expenses) in months.items():
+            print(f'{month_label(month)}: доход {income}, расходы {abs(expenses)}, баланс {income + expenses}')
+
+    def group_by_category_and_month(self):
+        pivot = self.columnar().pivot()
+        if not pivot:
+            print('Ничего не найдено')
+            return
+        print('Суммы по категориям и месяцам:')
+        for category, months in pivot.items():
+            cells = ', '.join(f'{month_label(month)}: {total}' for month, total in months.items())
+            print(f'{category}: {cells}')
+
 
 def finance_menu():
-    manager = FinanceManager()
+    manager = get_manager(FinanceManager)
 
     while True:
+        manager.storage.refresh()
         print('Управление финансовыми записями:')
         print('1. Добавить запись')
         print('2. Просмотреть записи')
@@ -655,9 +3210,13 @@ def finance_menu():
         print('5. Импортировать записи из CSV')
         print('6. Рассчитать итоговый баланс')
         print('7. Группировка по категориям')
-        print('8. Назад')
+        print('8. Редактировать запись')
+        print('9. Удалить запись')
+        print('10. Группировка по месяцам')
+        print('11. Группировка по категориям и месяцам')
+        print('12. Назад')
 
-        choise = int(input('Введите номер действия: '))
+        choise = read_choice('Введите номер действия: ')
 
         if choise == 1:
             try:
@@ -685,11 +3244,187 @@ def finance_menu():
         elif choise == 7:
             manager.group_by_category()
         elif choise == 8:
+            try:
+                record_id = int(input('Введите ID записи: '))
+                new_amount = input('Введите новую сумму: ')
+                new_amount = float(new_amount) if new_amount else None
+                new_category = input('Введите новую категорию: ')
+                new_date = input('Введите новую дату в формате ДД-ММ-ГГГГ: ')
+                new_description = input('Введите новое описание: ')
+                manager.edit_record(record_id, new_description, new_amount, new_category, new_date)
+            except ValueError:
+                print('Некорректный ID или сумма')
+        elif choise == 9:
+            try:
+                record_id = int(input('Введите ID записи: '))
+                manager.delete_record(record_id)
+            except ValueError:
+                print('Некорректный ID записи')
+        elif choise == 10:
+            manager.group_by_month()
+        elif choise == 11:
+            manager.group_by_category_and_month()
+        elif choise == 12:
             break
         else:
             print('Неверный номер действия, попробуйте снова')
 
 
+EXPRESSION_CACHE_SIZE = 256  # сколько скомпилированных выражений держать в памяти
+MAX_EXPRESSION_LENGTH = 1000
+MAX_EXPRESSION_DEPTH = 50  # вложенность скобок и вызовов функций
+MAX_OPERAND_BITS = 4096  # целые длиннее ~1200 знаков считаются ошибкой
+EXPRESSION_TIME_BUDGET = 0.1  # секунд на одно вычисление
+EXPRESSION_CHARS = re.compile(r'[0-9A-Za-z_+\-*/%()., \t]*')
+
+EXPRESSION_CONSTANTS = {'pi': math.pi, 'e': math.e, 'tau': math.tau}
+EXPRESSION_FUNCTIONS = {
+    'abs': abs, 'round': round, 'min': min, 'max': max, 'floor': math.floor, 'ceil': math.ceil,
+    'sqrt': math.sqrt, 'exp': math.exp, 'log': math.log, 'log2': math.log2, 'log10': math.log10,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'asin': math.asin, 'acos': math.acos, 'atan': math.atan,
+}
+# имена тех же функций в NumPy для вычисления сразу по столбцам
+VECTOR_FUNCTIONS = {
+    'abs': 'abs', 'round': 'round', 'floor': 'floor', 'ceil': 'ceil', 'sqrt': 'sqrt', 'exp': 'exp',
+    'log2': 'log2', 'log10': 'log10', 'sin': 'sin', 'cos': 'cos', 'tan': 'tan',
+    'asin': 'arcsin', 'acos': 'arccos', 'atan': 'arctan',
+}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def check_operand(value):
+    if isinstance(value, int) and value.bit_length() > MAX_OPERAND_BITS:
+        raise ExpressionError('Слишком большое число')
+    if isinstance(value, complex):
+        raise ExpressionError('Неверный пример')
+    return value
+
+
+def multiply(left, right):
+    if isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > MAX_OPERAND_BITS + 1:
+            raise ExpressionError('Слишком большое число')
+    return left * right
+
+
+def power(base, exponent):
+    # размер целого результата оценивается до возведения, чтобы 9**9**9 не считался минутами;
+    # дробная степень считается сразу: переполнение даёт OverflowError, а исчезающе малое значение — 0.0
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        if (abs(base).bit_length() - 1) * exponent > MAX_OPERAND_BITS:
+            raise ExpressionError('Слишком большое число')
+    return base ** exponent
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: multiply, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: power,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+def vector_function(name):
+    if name == 'log':
+        return lambda value, base=None: np.log(value) if base is None else np.log(value) / np.log(base)
+    if name in ('min', 'max'):
+        combine = np.minimum if name == 'min' else np.maximum
+        return lambda *values: functools.reduce(combine, values)
+    return getattr(np, VECTOR_FUNCTIONS[name])
+
+
+def compile_node(node, names, vectorized, depth=0):
+    # Узел превращается в функцию (переменные, срок) -> значение; поддеревья без переменных вычисляются сразу
+    if depth > MAX_EXPRESSION_DEPTH:
+        raise ExpressionError('Слишком сложный пример')
+    if isinstance(node, ast.Constant):
+        if type(node.value) not in (int, float):
+            raise ExpressionError('Неверный пример')
+        return True, check_operand(node.value)
+    if isinstance(node, ast.Name):
+        if node.id in EXPRESSION_CONSTANTS:
+            return True, EXPRESSION_CONSTANTS[node.id]
+        name = node.id
+        names.add(name)
+
+        def variable(scope, deadline):
+            try:
+                return scope[name]
+            except KeyError:
+                raise ExpressionError(f'Неизвестная переменная {name}')
+        return False, variable
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        apply = UNARY_OPERATORS[type(node.op)]
+        operands = [compile_node(node.operand, names, vectorized, depth + 1)]
+    elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        apply = BINARY_OPERATORS[type(node.op)]
+        # цепочка 1+2+3+... растёт влево и вложенностью не считается; длину ограничивает MAX_EXPRESSION_LENGTH
+        left_depth = depth if isinstance(node.left, ast.BinOp) else depth + 1
+        operands = [compile_node(node.left, names, vectorized, left_depth),
+                    compile_node(node.right, names, vectorized, depth + 1)]
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in EXPRESSION_FUNCTIONS or node.keywords:
+            raise ExpressionError(f'Неизвестная функция {ast.unparse(node.func)}')
+        apply = EXPRESSION_FUNCTIONS[node.func.id]
+        operands = [compile_node(arg, names, vectorized, depth + 1) for arg in node.args]
+        if vectorized and not all(constant for constant, _ in operands):
+            apply = vector_function(node.func.id)
+    else:
+        raise ExpressionError('Неверный пример')
+
+    if all(constant for constant, _ in operands):
+        return True, check_operand(apply(*(value for _, value in operands)))
+    parts = [(lambda scope, deadline, value=value: value) if constant else value for constant, value in operands]
+
+    if len(parts) == 2:
+        left, right = parts
+
+        def evaluate(scope, deadline):
+            if time.perf_counter() > deadline:
+                raise ExpressionError('Превышено время вычисления')
+            return check_operand(apply(left(scope, deadline), right(scope, deadline)))
+    else:
+        def evaluate(scope, deadline):
+            if time.perf_counter() > deadline:
+                raise ExpressionError('Превышено время вычисления')
+            return check_operand(apply(*[part(scope, deadline) for part in parts]))
+    return False, evaluate
+
+
+@functools.lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expression, vectorized=False):
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError('Слишком длинный пример')
+    if not EXPRESSION_CHARS.fullmatch(expression):
+        raise ExpressionError('Недопустимые символы в примере')
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except (SyntaxError, RecursionError, MemoryError):
+        raise ExpressionError('Неверный пример')
+    names = set()
+    constant, value = compile_node(tree.body, names, vectorized)
+    if constant:
+        return (lambda scope, deadline: value), frozenset()
+    return value, frozenset(names)
+
+
+@contextlib.contextmanager
+def expression_errors():
+    # ошибки вычисления сводятся к тем же сообщениям, что выводил калькулятор раньше
+    try:
+        yield
+    except ExpressionError:
+        raise
+    except ZeroDivisionError:
+        raise ExpressionError('Деление на ноль невозможно')
+    except OverflowError:
+        raise ExpressionError('Слишком большое число')
+    except Exception:
+        raise ExpressionError('Неверный пример')
+
+
 class Calculator:
     def __init__(self):
         pass
@@ -708,17 +3443,42 @@ class Calculator:
             raise ZeroDivisionError("Деление на ноль невозможно")
         return num1 / num2
 
-    def evaluate_expression(self, expression):
+    def evaluate_expression(self, expression, variables=None):
+        if variables and not all(isinstance(value, (int, float)) for value in variables.values()):
+            raise ExpressionError('Значения переменных должны быть числами')
+        with expression_errors():
+            evaluate, _ = compile_expression(expression)
+            return evaluate(variables or {}, time.perf_counter() + EXPRESSION_TIME_BUDGET)
+
+    def evaluate_many(self, expression, rows):
+        # Одно выражение по многим строкам переменных; строки, где вычислить не удалось, дают None
+        rows = list(rows)
+        with expression_errors():
+            _, names = compile_expression(expression)
+        columns = self.numeric_columns(names, rows)
+        if columns is None:
+            results = []
+            for row in rows:
+                try:
+                    results.append(float(self.evaluate_expression(expression, row)))
+                except (ValueError, OverflowError):
+                    results.append(None)
+        else:
+            with expression_errors():
+                evaluate, _ = compile_expression(expression, True)
+                with np.errstate(all='ignore'):
+                    # каждая операция выполняется один раз на весь столбец, поэтому срок не ограничивается
+                    values = np.broadcast_to(np.asarray(evaluate(columns, math.inf), dtype=float), (len(rows),))
+            results = values.tolist()
+        return [value if value is not None and math.isfinite(value) else None for value in results]
+
+    def numeric_columns(self, names, rows):
+        if not rows or load_numpy() is None:
+            return None
         try:
-            allowed_chars = "0123456789+-*/(). "
-            if not all(char in allowed_chars for char in expression):
-                raise ValueError("Недопустимые символы в примере")
-            result = eval(expression, {'__builtins__': None}, {})
-            return result
-        except ZeroDivisionError:
-            raise ValueError("Деление на ноль невозможно")
-        except Exception:
-            raise ValueError("Неверный пример")
+            return {name: np.array([row[name] for row in rows], dtype=float) for name in names}
+        except (KeyError, TypeError, ValueError):
+            return None  # неполные или нечисловые строки считаются по одной
 
 
 def calculator_menu():
@@ -732,7 +3492,7 @@ def calculator_menu():
         print('5. Вычислить выражение')
         print('6. Назад')
 
-        choise = int(input('Выберите действие: '))
+        choise = read_choice('Выберите действие: ')
 
 
         if choise == 1:
@@ -783,7 +3543,258 @@ def calculator_menu():
             print('Невалидный номер действия, попробуйте снова')
 
 
+managers = {}
+startup_timings = {}
+
+
+def get_manager(manager_class):
+    # менеджеры общие для всего процесса: данные читаются при первом обращении,
+    # а изменения других процессов подтягиваются по записям
+    manager = managers.get(manager_class)
+    if manager is not None:
+        manager.storage.refresh()
+    else:
+        started = time.perf_counter()
+        manager = managers[manager_class] = manager_class()
+        elapsed = (time.perf_counter() - started) * 1000
+        startup_timings[manager_class.__name__] = elapsed
+        if STARTUP_TRACE:
+            print(f'[запуск] {manager_class.__name__}: данные загружены за {elapsed:.1f} мс', file=sys.stderr)
+    return manager
+
+
+def cache_stats():
+    # по этим числам подбирается PA_RESULT_CACHE: частые вытеснения при низкой доле попаданий — кэш мал
+    return {manager_class.__name__: manager.results.stats() for manager_class, manager in managers.items()
+            if 'results' in vars(manager)}
+
+
+EXPORTS = [
+    (NoteManager, 'export_notes_to_csv', 'notes.csv'),
+    (TaskManager, 'export_tasks_to_csv', 'tasks.csv'),
+    (ContactManager, 'export_contacts_to_csv', 'contacts.csv'),
+    (FinanceManager, 'export_records_to_csv', 'records.csv'),
+]
+
+
+def export_all(directory='.', compress=False, chunk_rows=None, workers=EXPORT_WORKERS):
+    # хранилища загружаются заранее, а выгружаются параллельно; потоки перекрывают ожидание диска,
+    # но само формирование CSV упирается в GIL, поэтому выигрыш ограничен
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(getattr(get_manager(manager_class), method), os.path.join(directory, file_name))
+            for manager_class, method, file_name in EXPORTS]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export, file_name, compress=compress, chunk_rows=chunk_rows)
+                   for export, file_name in jobs]
+        reports = [future.result() for future in futures]
+    total = ExportReport()
+    for report in reports:
+        if report is not None:
+            total.files += report.files
+            total.rows += report.rows
+            total.bytes += report.bytes
+            total.disk_bytes += report.disk_bytes
+    total.seconds = time.perf_counter() - started
+    print(f'Все хранилища выгружены в каталог {directory}')
+    total.print_summary()
+    return total
+
+
+# границы корзин гистограмм в секундах, шаг 1-2.5-5 как в клиентах Prometheus
+LATENCY_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROFILE_TOP = 30  # сколько строк cProfile и tracemalloc попадает в отчёт
+
+# Замеряемые операции: методы менеджеров и функции ввода-вывода, сериализации и выдачи ID.
+# Обёртки ставит instrument(), без неё вызовы ничего не стоят
+INSTRUMENTED_METHODS = {
+    NoteManager: ('load_notes', 'add_note', 'list_notes', 'search_notes', 'view_note', 'edit_note', 'delete_note',
+                  'edit_notes', 'delete_notes', 'save_notes', 'export_notes_to_csv', 'import_notes_from_csv'),
+    TaskManager: ('load_tasks', 'add_task', 'list_tasks', 'mark_task_done', 'edit_task', 'delete_task',
+                  'mark_tasks_done', 'edit_tasks', 'delete_tasks', 'scheduled', 'save_tasks', 'export_tasks_to_csv',
+                  'import_tasks_from_csv'),
+    ContactManager: ('load_contacts', 'add_contact', 'find_contacts', 'search_contacts', 'edit_contact',
+                     'delete_contact', 'edit_contacts', 'delete_contacts', 'save_contacts', 'export_contacts_to_csv',
+                     'import_contacts_from_csv'),
+    FinanceManager: ('load_records', 'add_record', 'add_records', 'edit_record', 'delete_record', 'edit_records',
+                     'delete_records', 'view_records', 'report_totals', 'generate_report', 'balance',
+                     'category_totals', 'group_by_month', 'group_by_category_and_month', 'save_records',
+                     'export_records_to_csv', 'import_records_from_csv'),
+    Calculator: ('evaluate_expression', 'evaluate_many'),
+}
+INSTRUMENTED_FUNCTIONS = ('save_data', 'load_data', 'encode_data', 'decode_data', 'allocate_id', 'flush')
+
+histograms = {}
+instrumented = False
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя корзина — больше верхней границы
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, fraction):
+        # оценка сверху: граница корзины, в которую попадает квантиль
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        return list(itertools.accumulate(self.counts))
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum_sec': self.total,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+            'buckets': dict(zip([str(bound) for bound in self.bounds] + ['+Inf'], self.cumulative())),
+        }
+
+
+def timed(name, function):
+    histogram = histograms.setdefault(name, Histogram())
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def instrument():
+    # функции модуля вызываются друг из друга по глобальному имени, поэтому подмена в globals() видна всем
+    global instrumented
+    if instrumented:
+        return
+    instrumented = True
+    for owner, names in INSTRUMENTED_METHODS.items():
+        for name in names:
+            setattr(owner, name, timed(f'{owner.__name__}.{name}', getattr(owner, name)))
+    module = globals()
+    for name in INSTRUMENTED_FUNCTIONS:
+        module[name] = timed(name, module[name])
+
+
+def metrics_snapshot():
+    return {
+        'uptime_sec': time.perf_counter() - PROCESS_START,
+        'operations': {name: histogram.to_dict() for name, histogram in histograms.items() if histogram.count},
+        'io': dict(io_stats),
+        'scans': {query: {'queries': queries, 'records': records, 'per_query': records / queries}
+                  for query, (queries, records) in scan_stats.items()},
+        'caches': cache_stats(),
+    }
+
+
+def prometheus_metrics():
+    lines = ['# TYPE pa_operation_seconds histogram']
+    for name, histogram in histograms.items():
+        if not histogram.count:
+            continue
+        for bound, count in zip(list(histogram.bounds) + ['+Inf'], histogram.cumulative()):
+            lines.append(f'pa_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {count}')
+        lines.append(f'pa_operation_seconds_sum{{operation="{name}"}} {histogram.total}')
+        lines.append(f'pa_operation_seconds_count{{operation="{name}"}} {histogram.count}')
+    for key, metric in (('reads', 'pa_io_reads_total'), ('bytes_read', 'pa_io_read_bytes_total'),
+                        ('writes', 'pa_io_writes_total'), ('bytes', 'pa_io_written_bytes_total'),
+                        ('fsyncs', 'pa_io_fsyncs_total')):
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {io_stats[key]}')
+    lines.append('# TYPE pa_scan_queries_total counter')
+    lines.extend(f'pa_scan_queries_total{{query="{query}"}} {queries}' for query, (queries, _) in scan_stats.items())
+    lines.append('# TYPE pa_records_scanned_total counter')
+    lines.extend(f'pa_records_scanned_total{{query="{query}"}} {records}' for query, (_, records) in scan_stats.items())
+    caches = cache_stats()
+    for key in ('hits', 'misses', 'evictions'):
+        lines.append(f'# TYPE pa_cache_{key}_total counter')
+        lines.extend(f'pa_cache_{key}_total{{manager="{manager}"}} {stats[key]}' for manager, stats in caches.items())
+    lines.append('# TYPE pa_cache_entries gauge')
+    lines.extend(f'pa_cache_entries{{manager="{manager}"}} {stats["size"]}' for manager, stats in caches.items())
+    return '\n'.join(lines) + '\n'
+
+
+def dump_metrics(file_name):
+    # .prom — текстовый формат Prometheus (например, для node_exporter textfile), иначе JSON
+    if file_name.endswith('.prom'):
+        text = prometheus_metrics()
+    else:
+        text = json.dumps(metrics_snapshot(), ensure_ascii=False, indent=4)
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def print_operations(file):
+    print(f'{"Операция":<45}{"вызовов":>10}{"всего, с":>10}{"p50, мс":>10}{"p99, мс":>10}', file=file)
+    for name, histogram in sorted(histograms.items(), key=lambda item: -item[1].total):
+        if histogram.count:
+            print(f'{name:<45}{histogram.count:>10}{histogram.total:>10.3f}{histogram.quantile(0.5) * 1000:>10.3f}'
+                  f'{histogram.quantile(0.99) * 1000:>10.3f}', file=file)
+    for query, (queries, records) in scan_stats.items():
+        print(f'{query}: запросов {queries}, просмотрено записей {records} ({records / queries:.1f} на запрос)',
+              file=file)
+
+
+@contextlib.contextmanager
+def profiled(report_file):
+    # cProfile и tracemalloc замедляют работу в несколько раз, поэтому подключаются только по --profile
+    import cProfile
+    import pstats
+    import tracemalloc
+    instrument()
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(report_file, 'w', encoding='utf-8') as file:
+            print('Операции:', file=file)
+            print_operations(file)
+            print(f'\nВвод-вывод: {io_stats}', file=file)
+            print(f'\nПамять: сейчас {current / 2 ** 20:.1f} МБ, пик {peak / 2 ** 20:.1f} МБ', file=file)
+            for stat in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                print(stat, file=file)
+            print('\nПрофиль (по суммарному времени):', file=file)
+            pstats.Stats(profiler, stream=file).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        print(f'Профиль сеанса записан в файл {report_file}', file=sys.stderr)
+
+
+def report_startup():
+    elapsed = (time.perf_counter() - PROCESS_START) * 1000
+    startup_timings['first_prompt'] = elapsed
+    if STARTUP_TRACE:
+        print(f'[запуск] до первого приглашения: {elapsed:.1f} мс', file=sys.stderr)
+    if elapsed > STARTUP_BUDGET_MS:
+        print(f'[запуск] превышен бюджет запуска: {elapsed:.0f} мс при лимите {STARTUP_BUDGET_MS} мс', file=sys.stderr)
+
+
 def main_menu():
+    report_startup()
     while True:
         print('Добро пожаловать в Персональный ассистент!')
         print('Выберите действие:')
@@ -794,7 +3805,7 @@ def main_menu():
         print('5. Калькулятор')
         print('6. Выход')
 
-        choise = int(input('Введите номер действия: '))
+        choise = read_choice('Введите номер действия: ')
 
         if choise == 1:
             notes_menu()
@@ -813,5 +3824,261 @@ def main_menu():
             print('Неверный номер действия, попробуйте снова')
 
 
+def command(commands, name, manager_class, run, help=None):
+    parser = commands.add_parser(name, help=help)
+    parser.set_defaults(manager=manager_class, run=run)
+    return parser
+
+
+def export_options(parser, file_name=None):
+    if file_name is not None:
+        parser.add_argument('--file', default=file_name)
+    parser.add_argument('--gzip', action='store_true', help='сжать выгрузку (.csv.gz)')
+    parser.add_argument('--chunk-rows', type=parse_positive, metavar='N', help='делить выгрузку на файлы по N строк')
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='personal_assistant.py', description='Персональный ассистент')
+    parser.add_argument('--batch', metavar='FILE',
+                        help='выполнить команды из файла построчно (- — стандартный ввод)')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='замерять операции и сохранить метрики в FILE (.prom — формат Prometheus, иначе JSON)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='записать в FILE профиль сеанса: cProfile, tracemalloc и замеры операций')
+    parser.set_defaults(manager=None, run=None)
+    groups = parser.add_subparsers(dest='group')
+
+    notes = groups.add_parser('notes', help='заметки').add_subparsers(dest='command', required=True)
+    add = command(notes, 'add', NoteManager, lambda manager, args: manager.add_note(args.title, args.content))
+    add.add_argument('title')
+    add.add_argument('content')
+    command(notes, 'list', NoteManager, lambda manager, args: manager.list_notes())
+    show = command(notes, 'show', NoteManager, lambda manager, args: manager.view_note(args.id))
+    show.add_argument('id', type=int)
+    edit = command(notes, 'edit', NoteManager,
+                   lambda manager, args: manager.edit_note(args.id, args.title, args.content))
+    edit.add_argument('id', type=int)
+    edit.add_argument('title')
+    edit.add_argument('content')
+    delete = command(notes, 'delete', NoteManager, lambda manager, args: manager.delete_notes(args.ids))
+    delete.add_argument('ids', type=int, nargs='+')
+    search = command(notes, 'search', NoteManager, lambda manager, args: manager.search_notes(args.query, args.limit))
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=20)
+    export = command(notes, 'export', NoteManager, lambda manager, args: manager.export_notes_to_csv(
+        args.file, args.query, compress=args.gzip, chunk_rows=args.chunk_rows))
+    export_options(export, 'notes.csv')
+    export.add_argument('--query', help='выгрузить только найденные заметки')
+    load = command(notes, 'import', NoteManager, lambda manager, args: manager.import_notes_from_csv(args.file))
+    load.add_argument('file')
+    command(notes, 'gc', NoteManager, lambda manager, args: manager.collect_blobs(),
+            help='удалить файлы текстов, на которые не ссылается ни одна заметка')
+
+    tasks = groups.add_parser('tasks', help='задачи').add_subparsers(dest='command', required=True)
+    add = command(tasks, 'add', TaskManager, lambda manager, args: manager.add_task(
+        args.title, args.description, args.priority, args.due))
+    add.add_argument('title')
+    add.add_argument('--description', default='')
+    add.add_argument('--priority', default='Средний', choices=TASK_PRIORITIES)
+    add.add_argument('--due', metavar='ДД-ММ-ГГГГ')
+    command(tasks, 'list', TaskManager, lambda manager, args: manager.list_tasks())
+    done = command(tasks, 'done', TaskManager, lambda manager, args: manager.mark_tasks_done(args.ids))
+    done.add_argument('ids', type=int, nargs='+')
+    edit = command(tasks, 'edit', TaskManager, lambda manager, args: manager.edit_task(
+        args.id, args.title, args.description, args.priority, args.due))
+    edit.add_argument('id', type=int)
+    edit.add_argument('--title')
+    edit.add_argument('--description')
+    edit.add_argument('--priority', choices=TASK_PRIORITIES)
+    edit.add_argument('--due', metavar='ДД-ММ-ГГГГ')
+    delete = command(tasks, 'delete', TaskManager, lambda manager, args: manager.delete_tasks(args.ids))
+    delete.add_argument('ids', type=int, nargs='+')
+    upcoming = command(tasks, 'next', TaskManager, lambda manager, args: manager.show_tasks(manager.next_tasks(args.n)))
+    upcoming.add_argument('n', type=int, nargs='?', default=10)
+    overdue = command(tasks, 'overdue', TaskManager,
+                      lambda manager, args: manager.show_tasks(manager.overdue_tasks(args.today)))
+    overdue.add_argument('--today', type=parse_date)
+    due = command(tasks, 'due', TaskManager,
+                  lambda manager, args: manager.show_tasks(manager.due_between(args.start, args.end)))
+    due.add_argument('start', type=parse_date)
+    due.add_argument('end', type=parse_date)
+    export = command(tasks, 'export', TaskManager, lambda manager, args: manager.export_tasks_to_csv(
+        args.file, args.start, args.end, compress=args.gzip, chunk_rows=args.chunk_rows))
+    export_options(export, 'tasks.csv')
+    export.add_argument('--from', dest='start', type=parse_date, help='срок не раньше')
+    export.add_argument('--to', dest='end', type=parse_date, help='срок не позже')
+    load = command(tasks, 'import', TaskManager, lambda manager, args: manager.import_tasks_from_csv(args.file))
+    load.add_argument('file')
+
+    contacts = groups.add_parser('contacts', help='контакты').add_subparsers(dest='command', required=True)
+    add = command(contacts, 'add', ContactManager,
+                  lambda manager, args: manager.add_contact(args.name, args.phone, args.email))
+    add.add_argument('name')
+    add.add_argument('phone')
+    add.add_argument('email')
+    search = command(contacts, 'search', ContactManager,
+                     lambda manager, args: manager.search_contacts(args.query, args.limit))
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=SEARCH_RESULTS_LIMIT)
+    edit = command(contacts, 'edit', ContactManager,
+                   lambda manager, args: manager.edit_contact(args.id, args.name, args.phone, args.email))
+    edit.add_argument('id', type=int)
+    edit.add_argument('name')
+    edit.add_argument('phone')
+    edit.add_argument('email')
+    delete = command(contacts, 'delete', ContactManager, lambda manager, args: manager.delete_contacts(args.ids))
+    delete.add_argument('ids', type=int, nargs='+')
+    export = command(contacts, 'export', ContactManager, lambda manager, args: manager.export_contacts_to_csv(
+        args.file, args.query, compress=args.gzip, chunk_rows=args.chunk_rows))
+    export_options(export, 'contacts.csv')
+    export.add_argument('--query', help='выгрузить только найденные контакты')
+    load = command(contacts, 'import', ContactManager,
+                   lambda manager, args: manager.import_contacts_from_csv(args.file))
+    load.add_argument('file')
+
+    finance = groups.add_parser('finance', help='финансовые записи').add_subparsers(dest='command', required=True)
+    add = command(finance, 'add', FinanceManager, lambda manager, args: manager.add_record(
+        args.description, args.amount, args.category, args.date))
+    add.add_argument('amount', type=float)
+    add.add_argument('category')
+    add.add_argument('date', type=parse_date)
+    add.add_argument('description', nargs='?', default='')
+    view = command(finance, 'list', FinanceManager,
+                   lambda manager, args: manager.view_records(args.date, args.category))
+    view.add_argument('--date', type=parse_date)
+    view.add_argument('--category')
+    report = command(finance, 'report', FinanceManager,
+                     lambda manager, args: manager.generate_report(args.start, args.end))
+    report.add_argument('start', type=parse_date)
+    report.add_argument('end', type=parse_date)
+    command(finance, 'balance', FinanceManager, lambda manager, args: manager.calculate_balance())
+    edit = command(finance, 'edit', FinanceManager, lambda manager, args: manager.edit_record(
+        args.id, args.description, args.amount, args.category, args.date))
+    edit.add_argument('id', type=int)
+    edit.add_argument('--description')
+    edit.add_argument('--amount', type=float)
+    edit.add_argument('--category')
+    edit.add_argument('--date', type=parse_date)
+    delete = command(finance, 'delete', FinanceManager, lambda manager, args: manager.delete_records(args.ids))
+    delete.add_argument('ids', type=int, nargs='+')
+    command(finance, 'by-category', FinanceManager, lambda manager, args: manager.group_by_category())
+    command(finance, 'by-month', FinanceManager, lambda manager, args: manager.group_by_month())
+    command(finance, 'pivot', FinanceManager, lambda manager, args: manager.group_by_category_and_month())
+    export = command(finance, 'export', FinanceManager, lambda manager, args: manager.export_records_to_csv(
+        args.file, args.start, args.end, args.category, compress=args.gzip, chunk_rows=args.chunk_rows))
+    export_options(export, 'records.csv')
+    export.add_argument('--from', dest='start', type=parse_date, help='дата не раньше')
+    export.add_argument('--to', dest='end', type=parse_date, help='дата не позже')
+    export.add_argument('--category')
+    load = command(finance, 'import', FinanceManager,
+                   lambda manager, args: manager.import_records_from_csv(args.file))
+    load.add_argument('file')
+
+    calc = command(groups, 'calc', None, lambda manager, args: calculate(' '.join(args.expression), dict(args.var)),
+                   help='вычислить выражение')
+    calc.add_argument('expression', nargs='+')
+    calc.add_argument('--var', action='append', default=[], type=parse_variable, metavar='ИМЯ=ЧИСЛО')
+    export = export_options(command(groups, 'export-all', None, lambda manager, args: export_all(
+        args.dir, args.gzip, args.chunk_rows, args.workers), help='выгрузить все хранилища в CSV параллельно'))
+    export.add_argument('--dir', default='.')
+    export.add_argument('--workers', type=parse_positive, default=EXPORT_WORKERS)
+    command(groups, 'migrate-sqlite', None, lambda manager, args: migrate_to_sqlite(),
+            help='перенести данные из JSON в SQLite')
+    return parser
+
+
+def parse_date(value):
+    if not is_valid_date(value):
+        raise argparse.ArgumentTypeError(f'некорректная дата {value}, нужен формат ДД-ММ-ГГГГ')
+    return value
+
+
+def parse_positive(value):
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'некорректное число {value}, нужно целое больше нуля')
+    return number
+
+
+def parse_variable(value):
+    name, _, number = value.partition('=')
+    try:
+        return name.strip(), float(number)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'некорректная переменная {value}, нужен формат ИМЯ=ЧИСЛО')
+
+
+def calculate(expression, variables=None):
+    try:
+        print(f'Результат: {Calculator().evaluate_expression(expression, variables)}')
+    except ValueError as e:
+        print(f'Ошибка: {e}')
+
+
+def run_command(args):
+    manager = get_manager(args.manager) if args.manager is not None else None
+    args.run(manager, args)
+
+
+def run_batch(parser, lines):
+    # все команды выполняются в одном процессе: каждое хранилище загружается и сохраняется один раз
+    executed = failed = 0
+    with contextlib.ExitStack() as batches:
+        opened = set()
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                args = parser.parse_args(shlex.split(line))
+                if args.run is None or args.batch or args.metrics or args.profile:
+                    raise ValueError
+            except (SystemExit, ValueError):
+                print(f'Строка {line_number}: некорректная команда: {line}', file=sys.stderr)
+                failed += 1
+                continue
+            if args.manager is not None and args.manager not in opened:
+                batches.enter_context(get_manager(args.manager).batch())
+                opened.add(args.manager)
+            run_command(args)
+            executed += 1
+    print(f'Выполнено команд: {executed}, с ошибками: {failed}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.metrics:
+        instrument()
+    try:
+        with profiled(args.profile) if args.profile else contextlib.nullcontext():
+            return run_session(parser, args)
+    finally:
+        if args.metrics:
+            flush()
+            dump_metrics(args.metrics)
+
+
+def run_session(parser, args):
+    if args.batch == '-':
+        return run_batch(parser, sys.stdin)
+    if args.batch:
+        with open(args.batch, encoding='utf-8') as file:
+            return run_batch(parser, file)
+    if args.run is None:
+        main_menu()
+    else:
+        run_command(args)
+    return 0
+
+
 if __name__ == '__main__':
-    main_menu()
\ No newline at end of file
+    try:
+        sys.exit(main())
+    except (KeyboardInterrupt, EOFError):
+        print()
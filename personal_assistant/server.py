@@ -0,0 +1,430 @@
+import os
+import io
+import re
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import itertools
+import contextlib
+from collections import deque
+from urllib.parse import urlsplit, parse_qsl
+
+# изменения из запросов, пришедших в пределах окна, записываются на диск одной фиксацией
+os.environ.setdefault('PA_GROUP_COMMIT', '0.05')
+
+from personal_assistant import (NoteManager, TaskManager, ContactManager, FinanceManager, Calculator, SqliteStorage,
+                                get_manager, flush, io_rates, instrument, metrics_snapshot, prometheus_metrics,
+                                is_valid_date, dumps_compact, loads)
+
+DEFAULT_PORT = 8765
+PAGE_SIZE = 100
+METRICS_WINDOW = 10000  # сколько последних замеров времени ответа хранится для каждого маршрута
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+ROUTES = []
+latencies = {}
+requests_served = {}
+started_at = time.time()
+
+
+class PlainText(str):
+    # ответ отдаётся как есть, без обёртки JSON
+    pass
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def route(method, pattern):
+    def register(handler):
+        ROUTES.append((method, re.compile(pattern + '$'), handler))
+        return handler
+    return register
+
+
+def to_json(value):
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    return value
+
+
+def found(value):
+    if value is None:
+        raise HttpError(404, 'Не найдено')
+    return value
+
+
+def field(body, name, convert=str):
+    try:
+        return convert(body[name])
+    except KeyError:
+        raise HttpError(400, f'Не указано поле {name}')
+    except (TypeError, ValueError):
+        raise HttpError(400, f'Некорректное значение поля {name}')
+
+
+def date_field(data, name, required=True):
+    value = data.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str) or not is_valid_date(value):
+        raise HttpError(400, f'Поле {name}: нужна дата в формате ДД-ММ-ГГГГ')
+    return value
+
+
+def page(values, query):
+    offset = int(query.get('offset', 0))
+    limit = int(query.get('limit', PAGE_SIZE))
+    return list(itertools.islice(values, offset, offset + limit))
+
+
+@route('GET', r'/notes')
+def list_notes(query, body):
+    # в списке только заголовки: тексты длинных заметок читаются с диска лишь при запросе одной заметки
+    notes = page(get_manager(NoteManager).notes.values(), query)
+    return [{'note_id': note.note_id, 'title': note.title, 'timestamp': note.timestamp} for note in notes]
+
+
+@route('POST', r'/notes')
+def add_note(query, body):
+    return get_manager(NoteManager).add_note(field(body, 'title'), field(body, 'content'))
+
+
+@route('GET', r'/notes/search')
+def search_notes(query, body):
+    return get_manager(NoteManager).search_notes(query.get('q', ''), int(query.get('limit', 20)))
+
+
+@route('GET', r'/notes/(\d+)')
+def get_note(query, body, note_id):
+    return found(get_manager(NoteManager).get_note_by_id(note_id))
+
+
+@route('PUT', r'/notes/(\d+)')
+def edit_note(query, body, note_id):
+    return found(get_manager(NoteManager).edit_note(note_id, field(body, 'title'), field(body, 'content')))
+
+
+@route('DELETE', r'/notes/(\d+)')
+def delete_note(query, body, note_id):
+    return found(get_manager(NoteManager).delete_note(note_id))
+
+
+@route('GET', r'/tasks')
+def list_tasks(query, body):
+    return page(get_manager(TaskManager).tasks.values(), query)
+
+
+@route('POST', r'/tasks')
+def add_task(query, body):
+    task = get_manager(TaskManager).add_task(field(body, 'title'), body.get('description', ''),
+                                             body.get('priority', 'Средний'), date_field(body, 'due_date', False))
+    if task is None:
+        raise HttpError(400, 'Задача не добавлена')
+    return task
+
+
+@route('POST', r'/tasks/done')
+def mark_tasks_done(query, body):
+    return get_manager(TaskManager).mark_tasks_done(field(body, 'ids', list))
+
+
+@route('GET', r'/tasks/next')
+def next_tasks(query, body):
+    return get_manager(TaskManager).next_tasks(int(query.get('n', 10)))
+
+
+@route('GET', r'/tasks/overdue')
+def overdue_tasks(query, body):
+    return get_manager(TaskManager).overdue_tasks(date_field(query, 'today', False))
+
+
+@route('GET', r'/tasks/due')
+def due_tasks(query, body):
+    return get_manager(TaskManager).due_between(date_field(query, 'start'), date_field(query, 'end'))
+
+
+@route('GET', r'/tasks/(\d+)')
+def get_task(query, body, task_id):
+    return found(get_manager(TaskManager).get_task_by_id(task_id))
+
+
+@route('PUT', r'/tasks/(\d+)')
+def edit_task(query, body, task_id):
+    return found(get_manager(TaskManager).edit_task(task_id, body.get('title'), body.get('description'),
+                                                    body.get('priority'), date_field(body, 'due_date', False)))
+
+
+@route('POST', r'/tasks/(\d+)/done')
+def mark_task_done(query, body, task_id):
+    return found(get_manager(TaskManager).mark_task_done(task_id))
+
+
+@route('DELETE', r'/tasks/(\d+)')
+def delete_task(query, body, task_id):
+    return found(get_manager(TaskManager).delete_task(task_id))
+
+
+@route('GET', r'/contacts')
+def list_contacts(query, body):
+    return page(get_manager(ContactManager).contacts.values(), query)
+
+
+@route('POST', r'/contacts')
+def add_contact(query, body):
+    return get_manager(ContactManager).add_contact(field(body, 'name'), field(body, 'phone'), field(body, 'email'))
+
+
+@route('GET', r'/contacts/search')
+def search_contacts(query, body):
+    return get_manager(ContactManager).find_contacts(query.get('q', ''), int(query.get('limit', 50)))
+
+
+@route('GET', r'/contacts/(\d+)')
+def get_contact(query, body, contact_id):
+    return found(get_manager(ContactManager).get_contact_by_id(contact_id))
+
+
+@route('PUT', r'/contacts/(\d+)')
+def edit_contact(query, body, contact_id):
+    return found(get_manager(ContactManager).edit_contact(contact_id, field(body, 'name'), field(body, 'phone'),
+                                                          field(body, 'email')))
+
+
+@route('DELETE', r'/contacts/(\d+)')
+def delete_contact(query, body, contact_id):
+    return found(get_manager(ContactManager).delete_contact(contact_id))
+
+
+@route('GET', r'/finance')
+def list_records(query, body):
+    manager = get_manager(FinanceManager)
+    filter_date = date_field(query, 'date', False)
+    if isinstance(manager.storage, SqliteStorage):
+        records = manager.query_records(filter_date, query.get('category'))
+    else:
+        records = manager.scan_records(filter_date, query.get('category'))
+    return page(records, query)
+
+
+@route('POST', r'/finance')
+def add_record(query, body):
+    return get_manager(FinanceManager).add_record(body.get('description', ''), field(body, 'amount', float),
+                                                  field(body, 'category'), date_field(body, 'date'))
+
+
+@route('POST', r'/finance/batch')
+def add_records(query, body):
+    items = [{
+        'description': item.get('description', ''),
+        'amount': field(item, 'amount', float),
+        'category': field(item, 'category'),
+        'date': date_field(item, 'date'),
+    } for item in field(body, 'records', list)]
+    return get_manager(FinanceManager).add_records(items)
+
+
+@route('GET', r'/finance/balance')
+def balance(query, body):
+    return get_manager(FinanceManager).balance()
+
+
+@route('GET', r'/finance/categories')
+def categories(query, body):
+    return get_manager(FinanceManager).category_totals()
+
+
+@route('GET', r'/finance/report')
+def report(query, body):
+    start_date, end_date = date_field(query, 'start'), date_field(query, 'end')
+    count, income, expenses = get_manager(FinanceManager).report_totals(start_date, end_date)
+    return {'count': count, 'income': income, 'expenses': expenses, 'balance': income + expenses}
+
+
+@route('GET', r'/finance/(\d+)')
+def get_record(query, body, record_id):
+    return found(get_manager(FinanceManager).get_record_by_id(record_id))
+
+
+@route('PUT', r'/finance/(\d+)')
+def edit_record(query, body, record_id):
+    amount = field(body, 'amount', float) if 'amount' in body else None
+    return found(get_manager(FinanceManager).edit_record(record_id, body.get('description'), amount,
+                                                         body.get('category'), date_field(body, 'date', False)))
+
+
+@route('DELETE', r'/finance/(\d+)')
+def delete_record(query, body, record_id):
+    return found(get_manager(FinanceManager).delete_record(record_id))
+
+
+@route('POST', r'/calc')
+def calculate(query, body):
+    try:
+        expression = field(body, 'expression')
+        if 'rows' in body:
+            rows = field(body, 'rows', list)
+            if not all(isinstance(row, dict) for row in rows):
+                raise HttpError(400, 'Некорректное значение поля rows')
+            return Calculator().evaluate_many(expression, rows)
+        variables = field(body, 'variables', dict) if 'variables' in body else None
+        return Calculator().evaluate_expression(expression, variables)
+    except ValueError as e:
+        raise HttpError(400, str(e))
+
+
+@route('POST', r'/flush')
+def flush_now(query, body):
+    flush()
+    return True
+
+
+@route('GET', r'/metrics')
+def metrics(query, body):
+    routes = {}
+    for name, samples in latencies.items():
+        ordered = sorted(samples)
+        routes[name] = {
+            'requests': requests_served[name],
+            'p50_ms': percentile(ordered, 0.5),
+            'p99_ms': percentile(ordered, 0.99),
+        }
+    snapshot = metrics_snapshot()
+    return {'uptime_sec': time.time() - started_at, 'routes': routes, 'io': io_rates(),
+            'operations': snapshot['operations'], 'scans': snapshot['scans'], 'caches': snapshot['caches']}
+
+
+@route('GET', r'/metrics/prometheus')
+def metrics_prometheus(query, body):
+    return PlainText(prometheus_metrics())
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+
+def dispatch(method, target, raw_body):
+    url = urlsplit(target)
+    for route_method, pattern, handler in ROUTES:
+        match = pattern.match(url.path)
+        if match and route_method == method:
+            break
+    else:
+        return 404, {'error': 'Неизвестный метод или адрес', 'messages': []}, None
+    name = f'{method} {pattern.pattern[:-1]}'
+    output = io.StringIO()
+    try:
+        body = loads(raw_body) if raw_body else {}
+        if not isinstance(body, dict):
+            raise HttpError(400, 'Тело запроса должно быть объектом JSON')
+        # менеджеры сообщают о результате через print: эти сообщения возвращаются клиенту
+        with contextlib.redirect_stdout(output):
+            result = handler(dict(parse_qsl(url.query)), body, *(int(value) for value in match.groups()))
+        if isinstance(result, PlainText):
+            return 200, result, name
+        status, payload = 200, {'result': to_json(result)}
+    except HttpError as e:
+        status, payload = e.status, {'error': str(e)}
+    except ValueError:
+        status, payload = 400, {'error': 'Некорректный запрос'}
+    except Exception as e:
+        print(f'Ошибка при обработке {method} {target}: {e!r}', file=sys.stderr)
+        status, payload = 500, {'error': 'Внутренняя ошибка сервера'}
+    payload['messages'] = output.getvalue().splitlines()
+    return status, payload, name
+
+
+def http_response(status, payload, keep_alive):
+    if isinstance(payload, PlainText):
+        body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+    else:
+        body, content_type = dumps_compact(payload), 'application/json'
+    head = (f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+            f'Content-Type: {content_type}; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('ascii') + body
+
+
+async def handle_connection(reader, writer):
+    # соединение обслуживает запросы по очереди, поэтому конвейерные запросы получают ответы в том же порядке
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            started = time.perf_counter()
+            try:
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                method, target, version = request_line.split(' ', 2)
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+            except ValueError:
+                writer.write(http_response(400, {'error': 'Некорректный запрос'}, False))
+                break
+            raw_body = await reader.readexactly(length) if length else b''
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+            status, payload, name = dispatch(method, target, raw_body)
+            writer.write(http_response(status, payload, keep_alive))
+            if name is not None:
+                latencies.setdefault(name, deque(maxlen=METRICS_WINDOW)).append(
+                    (time.perf_counter() - started) * 1000)
+                requests_served[name] = requests_served.get(name, 0) + 1
+            if not keep_alive:
+                break
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port):
+    # все хранилища загружаются один раз при старте и дальше обслуживаются из памяти;
+    # замеры операций в сервере включены всегда, их стоимость мала по сравнению с обработкой запроса
+    instrument()
+    for manager_class in (NoteManager, TaskManager, ContactManager, FinanceManager):
+        get_manager(manager_class)
+    server = await asyncio.start_server(handle_connection, host, port)
+    print(f'Сервер запущен на http://{host}:{port}')
+    async with server:
+        await server.serve_forever()
+
+
+def stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP API персонального ассистента')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print('Сервер остановлен')
+    finally:
+        flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+MODULE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'personal_assistant')
+sys.path.insert(0, MODULE_DIR)
+
+import personal_assistant  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # каждый тест работает в своём каталоге; пути хранилищ абсолютные, чтобы atexit-сброс
+    # журналов и индекса заметок после теста не создавал файлов в текущем каталоге
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(personal_assistant, 'DURABLE_WRITES', False)
+    for name in ('NOTES_FILE', 'TASKS_FILE', 'CONTACTS_FILE', 'FINANCE_FILE', 'NOTES_INDEX_FILE'):
+        monkeypatch.setattr(personal_assistant, name, str(tmp_path / getattr(personal_assistant, name)))
+    return tmp_path
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+from personal_assistant import MAX_EXPRESSION_DEPTH, Calculator, ExpressionError
+
+
+@pytest.fixture
+def calculator():
+    return Calculator()
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('2 + 2 * 3', 8), ('(2 + 2) * 3', 12), ('7 // 2 + 7 % 2', 4), ('-3 ** 2', -9), ('2 ** -1', 0.5),
+    ('sqrt(16) + abs(-2)', 6.0), ('max(1, 5, 3) - min(4, 2)', 3), ('round(pi, 2)', 3.14), ('log(8, 2)', 3.0),
+    ('+'.join(['1'] * 52), 52), ('0.5 ** 100000', 0.0),
+])
+def test_arithmetic(calculator, expression, expected):
+    assert calculator.evaluate_expression(expression) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('1 / 0', 'Деление на ноль невозможно'),
+    ('9 ** 9 ** 9', 'Слишком большое число'),
+    ('10.0 ** 400', 'Слишком большое число'),
+    ('__import__("os")', 'Недопустимые символы в примере'),
+    ('().__class__', 'Неверный пример'),
+    ('open(1)', 'Неизвестная функция open'),
+    ('1 +', 'Неверный пример'),
+    ('1' * 1001, 'Слишком длинный пример'),
+    ('abs(' * (MAX_EXPRESSION_DEPTH + 1) + '1' + ')' * (MAX_EXPRESSION_DEPTH + 1), 'Слишком сложный пример'),
+    ('1+(' * (MAX_EXPRESSION_DEPTH + 1) + '1' + ')' * (MAX_EXPRESSION_DEPTH + 1), 'Слишком сложный пример'),
+    ('x + 1', 'Неизвестная переменная x'),
+])
+def test_rejected_expressions(calculator, expression, message):
+    with pytest.raises(ExpressionError, match=message):
+        calculator.evaluate_expression(expression)
+
+
+def test_variables(calculator):
+    assert calculator.evaluate_expression('price * (1 + rate)', {'price': 200, 'rate': 0.5}) == 300
+    with pytest.raises(ExpressionError):
+        calculator.evaluate_expression('x * 2', {'x': '3'})
+
+
+def test_evaluate_many_matches_single_evaluation(calculator):
+    rows = [{'x': 1, 'y': 2}, {'x': -4, 'y': 0.5}, {'x': 0, 'y': 3}]
+    expression = 'sqrt(abs(x)) * y + max(x, y)'
+    expected = [calculator.evaluate_expression(expression, row) for row in rows]
+    assert calculator.evaluate_many(expression, rows) == pytest.approx(expected)
+
+
+def test_evaluate_many_marks_failed_rows(calculator):
+    results = calculator.evaluate_many('10 / x', [{'x': 2}, {'x': 0}, {'y': 1}, {'x': 4}])
+    assert results == [5.0, None, None, 2.5]
+    assert calculator.evaluate_many('log(x)', [{'x': math.e}, {'x': -1}]) == [pytest.approx(1.0), None]
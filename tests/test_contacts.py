@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from personal_assistant import ContactManager, SubstringIndex, fold_text
+
+NAMES = ['Иван Петров', 'Анна Иванова', 'Пётр Сидоров', 'Мария Смирнова', 'Ольга Кузнецова', 'Сергей Волков']
+
+
+@pytest.fixture
+def contacts(data_dir):
+    random.seed(7)
+    manager = ContactManager()
+    manager.add_contact('Иван Петров', '+7 (900) 123-45-67', 'ivan@example.com')
+    with manager.batch():
+        for i in range(300):
+            manager.add_contact(f'{random.choice(NAMES)} {i}', f'+7 9{random.randint(0, 10 ** 9 - 1):09d}',
+                                f'user{i}@example.com')
+    return manager
+
+
+def expected(manager, index, field, query, limit):
+    # поиск перебором: сначала совпадения с начала строки, затем по позиции вхождения
+    query = index.normalize(query)
+    matches = []
+    for contact in manager.contacts.values():
+        value = index.normalize(getattr(contact, field))
+        position = value.find(query)
+        if position >= 0:
+            matches.append((position, value, contact.contact_id))
+    return [key for _, _, key in sorted(matches)[:limit]]
+
+
+@pytest.mark.parametrize('query', ['иван', 'петров 1', 'ова 2', 'ИВАНОВА', 'нет такого'])
+def test_name_search_matches_full_scan(contacts, query):
+    assert contacts.name_index.search(query, 20) == expected(contacts, contacts.name_index, 'name', query, 20)
+
+
+@pytest.mark.parametrize('query', ['900', '123-45', '4567'])
+def test_phone_search_matches_full_scan(contacts, query):
+    assert contacts.phone_index.search(query, 20) == expected(contacts, contacts.phone_index, 'phone', query, 20)
+
+
+@pytest.mark.parametrize('query', ['9', '99', 'а', 'ив'])
+def test_short_query_returns_limit_matches(contacts, query):
+    index = contacts.phone_index if query.isdigit() else contacts.name_index
+    field = 'phone' if query.isdigit() else 'name'
+    found = index.search(query, 20)
+    assert len(found) == len(set(found)) == 20
+    assert all(index.normalize(getattr(contacts.contacts[key], field)).find(index.normalize(query)) >= 0
+               for key in found)
+
+
+def test_bulk_load_and_edits_keep_index_consistent(contacts):
+    contacts.edit_contact(1, 'Зоя Белова', '+7 111 222 33 44', 'zoya@example.com')
+    contacts.delete_contact(2)
+    reloaded = ContactManager()
+    for manager in (contacts, reloaded):
+        assert [contact.contact_id for contact in manager.find_contacts('белова')] == [1]
+        assert [contact.contact_id for contact in manager.find_contacts('222 33')] == [1]
+        assert manager.name_index.sorted_values.keys == sorted(manager.name_index.sorted_values.keys)
+        assert len(manager.name_index.sorted_values) == len(manager.contacts)
+
+
+def test_add_many_matches_single_adds():
+    items = [(i, name) for i, name in enumerate(NAMES * 3)]
+    single, bulk = SubstringIndex(fold_text), SubstringIndex(fold_text)
+    for key, text in items:
+        single.add(key, text)
+    bulk.add_many(items[:5])
+    bulk.search('ова')  # триграммы построены: дальнейшие добавления обновляют их сразу
+    bulk.add_many(items[5:])
+    assert bulk.sorted_values.keys == single.sorted_values.keys
+    assert bulk.search('ова') == single.search('ова')
@@ -0,0 +1,57 @@
+import csv
+import gzip
+
+import pytest
+
+from personal_assistant import FinanceManager, build_parser, export_csv, read_csv_rows
+
+HEADER = ['ID', 'Значение']
+ROWS = [(i, f'строка {i}') for i in range(1, 8)]
+
+
+def read_rows(path):
+    return [[int(row['ID']), row['Значение']] for _, row in read_csv_rows(str(path))]
+
+
+def test_chunks_split_rows_in_order(tmp_path):
+    report = export_csv(str(tmp_path / 'data.csv'), HEADER, iter(ROWS), chunk_rows=3)
+    assert [path.rsplit('/', 1)[-1] for path in report.files] == ['data.001.csv', 'data.002.csv', 'data.003.csv']
+    assert [len(read_rows(path)) for path in report.files] == [3, 3, 1]
+    assert [row for path in report.files for row in read_rows(path)] == [list(row) for row in ROWS]
+    assert report.rows == len(ROWS)
+
+
+def test_gzip_export_round_trip(tmp_path):
+    report = export_csv(str(tmp_path / 'data.csv'), HEADER, ROWS, compress=True)
+    assert report.files == [str(tmp_path / 'data.csv.gz')]
+    with gzip.open(report.files[0], 'rt', newline='', encoding='utf-8') as file:
+        assert next(csv.reader(file)) == HEADER
+    assert read_rows(report.files[0]) == [list(row) for row in ROWS]
+    assert report.disk_bytes < report.bytes
+
+
+def test_empty_export_still_writes_header(tmp_path):
+    report = export_csv(str(tmp_path / 'data.csv'), HEADER, [], chunk_rows=5)
+    assert len(report.files) == 1 and read_rows(report.files[0]) == []
+
+
+@pytest.mark.parametrize('chunk_rows', [0, -1])
+def test_chunk_rows_must_be_positive(tmp_path, chunk_rows):
+    with pytest.raises(ValueError):
+        export_csv(str(tmp_path / 'data.csv'), HEADER, ROWS, chunk_rows=chunk_rows)
+    assert list(tmp_path.iterdir()) == []
+    assert build_parser().parse_args(['finance', 'export', '--chunk-rows', '2']).chunk_rows == 2
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(['finance', 'export', '--chunk-rows', str(chunk_rows)])
+
+
+def test_finance_export_filters(data_dir):
+    finance = FinanceManager()
+    finance.add_record('Зарплата', 1000, 'Доход', '05-01-2024')
+    finance.add_record('Кафе', -80, 'Еда', '15-02-2024')
+    finance.add_record('Продукты', -150, 'Еда', '07-03-2024')
+    report = finance.export_records_to_csv(str(data_dir / 'food.csv'), start_date='01-02-2024',
+                                           end_date='31-03-2024', category='еда')
+    assert [row['Описание'] for _, row in read_csv_rows(report.files[0])] == ['Кафе', 'Продукты']
+    with pytest.raises(ValueError):
+        finance.export_records_to_csv(str(data_dir / 'bad.csv'), start_date='31-02-2024')
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+import personal_assistant
+from personal_assistant import FinanceManager, FinanceTotals, date_ordinal
+
+RECORDS = [
+    ('Зарплата', 1000, 'Доход', '05-01-2024'),
+    ('Продукты', -150, 'Еда', '07-01-2024'),
+    ('Кафе', -80, 'Еда', '15-02-2024'),
+    ('Премия', 300, 'Доход', '01-03-2024'),
+    ('Такси', -40, 'Транспорт', '02-03-2024'),
+]
+
+
+def rebuilt_totals(finance):
+    totals = FinanceTotals({})
+    for record in finance.records.values():
+        totals.add(record)
+    return totals.data
+
+
+@pytest.fixture(params=['json', 'journal'])
+def finance(request, data_dir, monkeypatch):
+    monkeypatch.setattr(personal_assistant, 'STORAGE_BACKEND', request.param)
+    finance = FinanceManager()
+    for record in RECORDS:
+        finance.add_record(*record)
+    return finance
+
+
+def test_totals_follow_add_edit_and_delete(finance):
+    assert finance.totals.data == rebuilt_totals(finance)
+    finance.edit_record(2, new_amount=-200, new_category='Продукты')
+    finance.edit_record(3, new_date='20-04-2024')
+    assert finance.totals.data == rebuilt_totals(finance)
+    finance.delete_record(5)
+    finance.edit_records(lambda record: record.category == 'Доход', new_amount=500)
+    finance.delete_records([1, 99])
+    assert finance.totals.data == rebuilt_totals(finance)
+    assert finance.totals.balance() == sum(record.amount for record in finance.records.values())
+    assert finance.report_totals('01-01-2024', '31-03-2024') == (2, 500, -200)
+
+    reloaded = FinanceManager()
+    assert reloaded.totals.data == finance.totals.data
+
+
+def test_partitioned_finance_loads_lazily(data_dir, monkeypatch, capsys):
+    monkeypatch.setattr(personal_assistant, 'FINANCE_PARTITIONS', True)
+    finance = FinanceManager()
+    for record in RECORDS:
+        finance.add_record(*record)
+    assert sorted(os.listdir(data_dir / 'finance.parts')) == ['2024-01.json', '2024-02.json', '2024-03.json',
+                                                              'manifest.json']
+
+    cold = FinanceManager()
+    assert not cold.loaded()
+    assert cold.report_totals('01-01-2024', '31-01-2024') == (2, 1000, -150)
+    assert cold.report_totals('01-01-2024', '01-03-2024') == (4, 1300, -230)
+    capsys.readouterr()
+    cold.view_records(filter_date='15-02-2024')
+    assert 'Кафе' in capsys.readouterr().out
+    assert set(cold.storage.cache) == {'2024-02', '2024-03'}  # январь посчитан по манифесту целиком
+    assert not cold.loaded()
+
+    assert cold.records.keys() == finance.records.keys()
+    assert cold.loaded()
+    assert cold.totals.data == rebuilt_totals(cold)
+
+
+def test_partition_migration_retires_single_file(data_dir, monkeypatch, capsys):
+    finance = FinanceManager()
+    for record in RECORDS:
+        finance.add_record(*record)
+
+    monkeypatch.setattr(personal_assistant, 'FINANCE_PARTITIONS', True)
+    migrated = FinanceManager()
+    assert sorted(migrated.records) == [1, 2, 3, 4, 5]
+    assert not os.path.exists(data_dir / 'finance.json')
+    assert os.path.exists(data_dir / 'finance.json.migrated')
+    assert migrated.add_record('Книга', -20, 'Досуг', '10-03-2024').record_id == 6
+
+    monkeypatch.setattr(personal_assistant, 'FINANCE_PARTITIONS', False)
+    capsys.readouterr()
+    FinanceManager()
+    assert 'PA_FINANCE_PARTITIONS=1' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('mode', ['index', 'columnar', 'partitioned'])
+@pytest.mark.parametrize('start, end', [('01-01-2024', '31-01-2024'), ('06-01-2024', '01-03-2024'),
+                                        ('01-01-2023', '31-12-2024'), ('16-02-2024', '29-02-2024'),
+                                        ('01-03-2024', '01-01-2024')])
+def test_report_totals_match_scan_in_every_mode(data_dir, monkeypatch, mode, start, end):
+    monkeypatch.setattr(personal_assistant, 'COLUMNAR_ANALYTICS', mode == 'columnar')
+    monkeypatch.setattr(personal_assistant, 'FINANCE_PARTITIONS', mode == 'partitioned')
+    writer = FinanceManager()
+    for record in RECORDS:
+        writer.add_record(*record)
+    finance = FinanceManager() if mode == 'partitioned' else writer  # партиции читаются без полной загрузки
+    low, high = date_ordinal(start), date_ordinal(end)
+    amounts = [amount for _, amount, _, date in RECORDS if low <= date_ordinal(date) <= high]
+    expected = (len(amounts), sum(amount for amount in amounts if amount > 0),
+                sum(amount for amount in amounts if amount < 0))
+    assert finance.report_totals(start, end) == expected
+
+
+def test_reversed_period_has_no_records(finance, capsys):
+    capsys.readouterr()
+    finance.generate_report('01-03-2024', '01-01-2024')
+    assert capsys.readouterr().out.strip() == 'Нет записей за указанный период.'
@@ -0,0 +1,55 @@
+import csv
+
+import pytest
+
+from personal_assistant import ContactManager, FinanceManager, NoteManager, TaskManager
+
+CASES = [
+    (NoteManager, 'import_notes_from_csv', 'notes', ['ID', 'Заголовок', 'Содержимое', 'Дата'],
+     [['1', 'Покупки', 'хлеб', '2024-01-01 10:00:00'], ['2'], ['3', 'Звонок', 'маме', '2024-01-02 10:00:00']]),
+    (TaskManager, 'import_tasks_from_csv', 'tasks', ['ID', 'Заголовок', 'Описание', 'Статус', 'Приоритет', 'Срок'],
+     [['1', 'Отчёт', 'квартал', 'Не выполненo', 'Высокий', '01-02-2024'], ['2', 'Короткая'],
+      ['3', 'Звонок', '', 'Выполненo', 'Низкий', '']]),
+    (ContactManager, 'import_contacts_from_csv', 'contacts', ['ID', 'Имя', 'Телефон', 'Электронная почта'],
+     [['1', 'Иван', '+7 900 123', 'ivan@example.com'], ['2', 'Петр'], ['3', 'Анна', '+7 900 456', 'anna@example.com']]),
+    (FinanceManager, 'import_records_from_csv', 'records', ['ID', 'Описание', 'Сумма', 'Категория', 'Дата'],
+     [['1', 'Зарплата', '1000', 'Доход', '05-01-2024'], ['2', 'short', '5'],
+      ['3', 'Кафе', '-80', 'Еда', '15-02-2024']]),
+]
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+@pytest.mark.parametrize('manager_class, method, attribute, header, rows', CASES,
+                         ids=[case[2] for case in CASES])
+def test_short_row_is_rejected_without_aborting_import(data_dir, manager_class, method, attribute, header, rows):
+    write_csv(data_dir / 'import.csv', header, rows)
+    manager = manager_class()
+    report = getattr(manager, method)(str(data_dir / 'import.csv'), batch_size=2,
+                                      rejected_file=str(data_dir / 'rejected.csv'))
+
+    assert (report.processed, report.imported, report.rejected) == (3, 2, 1)
+    assert report.errors[0][0] == 3  # номер строки файла с учётом заголовка
+    assert len(getattr(manager, attribute)) == 2
+    assert len(getattr(manager_class(), attribute)) == 2  # обе пачки записаны на диск
+    with open(data_dir / 'rejected.csv', newline='', encoding='utf-8') as file:
+        rejected = list(csv.reader(file))
+    assert rejected[0][:2] == ['Строка', 'Ошибка'] and rejected[1][0] == '3'
+
+
+def test_invalid_values_are_reported(data_dir):
+    write_csv(data_dir / 'finance.csv', ['Описание', 'Сумма', 'Категория', 'Дата'],
+              [['Кафе', 'много', 'Еда', '15-02-2024'], ['Кафе', '-80', 'Еда', '31-02-2024'],
+               ['Кафе', '-80', 'Еда', '15-02-2024']])
+    report = FinanceManager().import_records_from_csv(str(data_dir / 'finance.csv'))
+    assert (report.imported, report.rejected) == (1, 2)
+    assert [reason for _, reason in report.errors] == ['некорректная сумма много', 'некорректная дата 31-02-2024']
+
+    write_csv(data_dir / 'contacts.csv', ['ID', 'Имя', 'Телефон'], [['1', 'Иван', '+7 900']])
+    report = ContactManager().import_contacts_from_csv(str(data_dir / 'contacts.csv'))
+    assert report.rejected == 1 and 'Электронная почта' in report.errors[0][1]
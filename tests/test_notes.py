@@ -0,0 +1,137 @@
+import os
+import time
+
+import pytest
+
+import personal_assistant
+from personal_assistant import BLOB_RAW, BLOB_ZLIB, BlobStore, Note, NoteManager, NoteSearchIndex
+
+LONG_TEXT = 'Длинная заметка о встрече по проекту. ' * 20
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    return BlobStore(str(tmp_path / 'notes.blobs'))
+
+
+def stored_files(store):
+    return [os.path.join(root, name) for root, _, names in os.walk(store.directory) for name in names]
+
+
+def test_blob_round_trip_and_deduplication(blobs):
+    blob = blobs.put(LONG_TEXT)
+    assert blobs.get(blob) == LONG_TEXT
+    assert blobs.put(LONG_TEXT) == blob
+    assert stored_files(blobs) == [blobs.path(blob)]
+
+
+def test_blob_compression(blobs, tmp_path):
+    with open(blobs.path(blobs.put(LONG_TEXT)), 'rb') as file:
+        data = file.read()
+    assert data[:1] == BLOB_ZLIB and len(data) < len(LONG_TEXT.encode('utf-8'))
+
+    short = blobs.put('ab')  # zlib только увеличил бы файл
+    with open(blobs.path(short), 'rb') as file:
+        assert file.read() == BLOB_RAW + b'ab'
+
+    plain = BlobStore(str(tmp_path / 'plain'), compress=False)
+    blob = plain.put(LONG_TEXT)
+    assert plain.get(blob) == LONG_TEXT
+    with open(plain.path(blob), 'rb') as file:
+        assert file.read()[:1] == BLOB_RAW
+
+
+def test_blob_collection_keeps_live_and_fresh_files(blobs):
+    live = blobs.put(LONG_TEXT)
+    dead = blobs.put('удалённая заметка ' * 30)
+    assert blobs.collect({live}) == 0  # свежие файлы не трогаются
+    old = time.time() - 7200
+    for path in stored_files(blobs):
+        os.utime(path, (old, old))
+    assert blobs.collect({live}) == 1
+    assert stored_files(blobs) == [blobs.path(live)]
+    assert not os.path.exists(blobs.path(dead))
+
+
+def test_long_note_content_moves_to_blob(blobs, monkeypatch):
+    monkeypatch.setattr(Note, 'blobs', blobs)
+    note = Note(1, 'Встреча', LONG_TEXT, '2024-01-01 10:00:00')
+    record = note.to_record()
+    assert 'content' not in record and record['blob'] == note.blob
+    restored = Note.from_dict(record)
+    assert restored.body is None
+    assert restored.content == LONG_TEXT
+
+    short = Note(2, 'Купить', 'хлеб', '2024-01-01 10:00:00').to_record()
+    assert short['content'] == 'хлеб' and 'blob' not in short
+
+
+def fresh_index(manager):
+    index = NoteSearchIndex()
+    for note in manager.notes.values():
+        index.add(note)
+    return index
+
+
+@pytest.fixture
+def notes(data_dir):
+    manager = NoteManager()
+    manager.add_note('Встреча по проекту', 'обсудить сроки и бюджет')
+    manager.add_note('Покупки', 'молоко, хлеб, встреча с курьером')
+    manager.add_note('Проектирование', 'схема базы данных для проекта')
+    manager.add_note('Отпуск', 'забронировать отель')
+    manager.save_search_index()
+    return manager
+
+
+def test_search_ranks_title_matches_and_requires_all_words(notes):
+    assert notes.search_index.search('встреча') == [1, 2]  # слово из заголовка весит больше
+    assert sorted(notes.search_index.search('проект')) == [1, 3]  # по префиксу: «проекту», «проектирование»
+    assert notes.search_index.search('схема') == [3]
+    assert notes.search_index.search('встреча хлеб') == [2]
+    assert notes.search_index.search('встреча отель') == []
+    assert notes.search_index.search('') == []
+
+
+def test_index_changes_are_appended_to_log(notes):
+    snapshot = os.stat(notes.index_file)
+    reloaded = NoteManager()
+    assert reloaded.search_index.saved
+    reloaded.add_note('Звонок', 'позвонить в банк')
+    reloaded.edit_note(1, 'Встреча отменена', 'перенести')
+    reloaded.delete_note(4)
+    reloaded.save_search_index()
+    assert os.stat(notes.index_file).st_mtime_ns == snapshot.st_mtime_ns
+    assert os.path.exists(notes.index_file + '.log')
+
+    restored = NoteManager()
+    assert restored.search_index.saved and not restored.index_dirty
+    assert restored.search_index.documents == fresh_index(restored).documents
+    assert restored.search_index.search('банк') == [5]
+    assert restored.search_index.search('отель') == []
+
+
+def test_index_log_is_compacted(notes, monkeypatch):
+    monkeypatch.setattr(personal_assistant, 'NOTE_INDEX_LOG_LIMIT', 3)
+    manager = NoteManager()
+    manager.add_note('Звонок', 'позвонить в банк')
+    manager.save_search_index()  # две строки журнала: изменение и отпечаток
+    manager.add_note('Письмо', 'ответить на письмо')
+    manager.save_search_index()
+    assert not os.path.exists(notes.index_file + '.log')
+    assert NoteManager().search_index.documents == fresh_index(manager).documents
+
+
+def test_stale_or_torn_index_is_rebuilt(notes):
+    other = NoteManager()
+    other.add_note('Без индекса', 'процесс упал до сохранения индекса')
+    other.index_dirty = False
+    rebuilt = NoteManager()
+    assert not rebuilt.search_index.saved and rebuilt.search_index.search('упал') == [5]
+    rebuilt.save_search_index()
+
+    with open(notes.index_file + '.log', 'ab') as file:
+        file.write(b'{"id": 9, "terms": {"ghost": 1}}\n{"stamp": [')
+    torn = NoteManager()
+    assert not torn.search_index.saved
+    assert torn.search_index.search('ghost') == []
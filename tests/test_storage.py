@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import personal_assistant
+from personal_assistant import JournalStorage, load_data
+
+BACKENDS = ['json', 'journal', 'sqlite']
+
+FINANCE_SCRIPT = '''
+import json
+import sys
+from personal_assistant import FinanceManager
+finance = FinanceManager()
+for _ in range(int(sys.argv[1])):
+    finance.add_record('покупка', -10, 'Еда', '01-02-2024')
+for record_id in json.loads(sys.argv[2]):
+    finance.delete_record(record_id)
+print(json.dumps(sorted(finance.records)))
+'''
+
+
+def journal_storage(path, items):
+    # снимок — словарь записей, который ведёт сам тест, как это делают менеджеры
+    return JournalStorage(str(path), 'id', lambda: list(items.values()))
+
+
+def by_id(data):
+    return sorted(data, key=lambda item: item['id'])
+
+
+def start_finance(directory, backend, adds, deletes=()):
+    env = dict(os.environ, PA_STORAGE=backend, PA_FSYNC='0',
+               PYTHONPATH=os.path.dirname(os.path.abspath(personal_assistant.__file__)))
+    return subprocess.Popen([sys.executable, '-c', FINANCE_SCRIPT, str(adds), json.dumps(list(deletes))],
+                            cwd=directory, env=env, stdout=subprocess.PIPE, text=True)
+
+
+def finish(process):
+    output, _ = process.communicate(timeout=60)
+    assert process.returncode == 0
+    return json.loads(output.splitlines()[-1])
+
+
+def test_journal_replays_puts_and_deletes(data_dir):
+    items = {}
+    storage = journal_storage(data_dir / 'items.json', items)
+    storage.load()
+    for key in (1, 2, 3):
+        items[key] = {'id': key, 'value': key * 10}
+        storage.put(items[key])
+    del items[2]
+    storage.delete(2)
+    items[3] = {'id': 3, 'value': 33}
+    storage.put(items[3])
+
+    reloaded = journal_storage(data_dir / 'items.json', {})
+    assert by_id(reloaded.load()) == [{'id': 1, 'value': 10}, {'id': 3, 'value': 33}]
+    assert reloaded.replayed == 5
+    assert reloaded.meta['next_id'] == 4
+
+
+def test_journal_ignores_torn_tail(data_dir):
+    items = {1: {'id': 1}}
+    storage = journal_storage(data_dir / 'items.json', items)
+    storage.load()
+    storage.put(items[1])
+    with open(storage.journal_path, 'ab') as file:
+        file.write(b'{"op": "put", "data": {"id": 2')  # процесс упал посреди записи
+
+    reloaded_items = {}
+    reloaded = journal_storage(data_dir / 'items.json', reloaded_items)
+    reloaded_items.update((item['id'], item) for item in reloaded.load())
+    assert list(reloaded_items) == [1]
+    reloaded_items[3] = {'id': 3}
+    reloaded.put(reloaded_items[3])
+
+    assert by_id(journal_storage(data_dir / 'items.json', {}).load()) == [{'id': 1}, {'id': 3}]
+
+
+def test_journal_compaction_folds_journal_into_snapshot(data_dir, monkeypatch):
+    monkeypatch.setattr(personal_assistant, 'JOURNAL_COMPACT_THRESHOLD', 5)
+    items = {}
+    storage = journal_storage(data_dir / 'items.json', items)
+    storage.load()
+    for key in range(1, 6):
+        items[key] = {'id': key}
+        storage.put(items[key])
+    storage.wait()
+
+    assert not os.path.exists(storage.journal_path)
+    assert by_id(load_data(storage.file_path, [])) == list(items.values())
+    reloaded = journal_storage(data_dir / 'items.json', {})
+    assert by_id(reloaded.load()) == list(items.values())
+    assert reloaded.replayed == 0
+
+
+def test_interrupted_compaction_is_recovered(data_dir):
+    items = {}
+    storage = journal_storage(data_dir / 'items.json', items)
+    storage.load()
+    for key in (1, 2):
+        items[key] = {'id': key}
+        storage.put(items[key])
+    os.replace(storage.journal_path, storage.compacting_path)  # сжатие прежней версии не дошло до снимка
+
+    reloaded = journal_storage(data_dir / 'items.json', {})
+    assert by_id(reloaded.load()) == [{'id': 1}, {'id': 2}]
+    assert not os.path.exists(reloaded.compacting_path)
+    assert by_id(load_data(reloaded.file_path, [])) == [{'id': 1}, {'id': 2}]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_deleted_ids_are_not_reused_after_reload(tmp_path, backend):
+    assert finish(start_finance(tmp_path, backend, 3, [3])) == [1, 2]
+    assert finish(start_finance(tmp_path, backend, 1)) == [1, 2, 4]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_processes_get_distinct_ids(tmp_path, backend):
+    finish(start_finance(tmp_path, backend, 0))  # хранилище создаётся до гонки
+    workers = [start_finance(tmp_path, backend, 25) for _ in range(4)]
+    for worker in workers:
+        finish(worker)
+    assert finish(start_finance(tmp_path, backend, 0)) == list(range(1, 101))
@@ -0,0 +1,57 @@
+import datetime
+import random
+
+import pytest
+
+from personal_assistant import TASK_PRIORITIES, TaskManager, date_ordinal
+
+
+@pytest.fixture
+def tasks(data_dir):
+    random.seed(3)
+    manager = TaskManager()
+    with manager.batch():
+        for i in range(60):
+            due = None if i % 7 == 0 else f'{random.randint(1, 28):02d}-{random.randint(1, 3):02d}-2024'
+            manager.add_task(f'Задача {i}', '', random.choice(TASK_PRIORITIES), due)
+    manager.mark_tasks_done([task_id for task_id in manager.tasks if task_id % 5 == 0])
+    manager.edit_task(3, new_due_date='01-01-2024', new_priority='Высокий')
+    manager.delete_task(4)
+    return manager
+
+
+def scan_key(task):
+    # ожидаемый порядок: по сроку (без срока — в конце), затем от высокого приоритета к низкому
+    due = date_ordinal(task.due_date) if task.due_date else datetime.date.max.toordinal() + 1
+    return due, TASK_PRIORITIES[::-1].index(task.priority), task.task_id
+
+
+def open_tasks(manager, predicate=lambda task: True):
+    found = [task for task in manager.tasks.values() if not task.done and predicate(task)]
+    return [task.task_id for task in sorted(found, key=scan_key)]
+
+
+def test_next_tasks_follow_due_date_then_priority(tasks):
+    assert [task.task_id for task in tasks.next_tasks(15)] == open_tasks(tasks)[:15]
+    assert tasks.next_tasks(1)[0].task_id == 3
+
+
+def test_overdue_and_due_between_match_scan(tasks):
+    today = date_ordinal('15-02-2024')
+    assert [task.task_id for task in tasks.overdue_tasks('15-02-2024')] == open_tasks(
+        tasks, lambda task: task.due_date and date_ordinal(task.due_date) < today)
+    low, high = date_ordinal('10-01-2024'), date_ordinal('20-02-2024')
+    assert [task.task_id for task in tasks.due_between('10-01-2024', '20-02-2024')] == open_tasks(
+        tasks, lambda task: task.due_date and low <= date_ordinal(task.due_date) <= high)
+
+
+def test_schedule_survives_reload(tasks):
+    reloaded = TaskManager()
+    assert [task.task_id for task in reloaded.next_tasks(60)] == open_tasks(tasks)
+    assert reloaded.schedule.keys == sorted(task.schedule_key() for task in tasks.tasks.values())
+
+
+@pytest.mark.parametrize('method, args', [('overdue_tasks', ('31-02-2024',)), ('due_between', ('01-01-2024', 'x'))])
+def test_malformed_dates_raise(tasks, method, args):
+    with pytest.raises(ValueError):
+        getattr(tasks, method)(*args)